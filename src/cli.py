@@ -9,8 +9,11 @@ __email__ = "jboursier@malwarebytes.com"
 __status__ = "Production"
 
 try:
+    import csv
     import json
     import logging
+    import os
+    from collections import deque
     from datetime import datetime
     from typing import Any, Dict, List
 
@@ -25,8 +28,15 @@ except ImportError:
 
 from ghas_cli.utils import (
     actions,
+    aggregation,
+    cache,
+    code_security,
     dependabot,
+    dependency_index,
+    dependency_snapshot,
+    export,
     issues,
+    licenses,
     repositories,
     roles,
     secrets,
@@ -98,6 +108,47 @@ def vuln_alerts() -> None:
     type=str,
     multiple=True,
 )
+@click.option(
+    "-v",
+    "--severity",
+    type=click.Choice(
+        ["", "critical", "high", "medium", "low", "warning", "note", "error"],
+        case_sensitive=False,
+    ),
+    default="",
+)
+@click.option(
+    "-w",
+    "--workers",
+    type=int,
+    default=4,
+    help="Number of repositories fetched at once",
+)
+@click.option(
+    "-n",
+    "--negative-cache",
+    type=click.Path(dir_okay=False),
+    default=None,
+    help="File remembering the repositories without code scanning",
+)
+@click.option(
+    "--negative-cache-ttl",
+    type=int,
+    default=168,
+    help="Hours before re-probing a repository without code scanning",
+)
+@click.option(
+    "-f",
+    "--format",
+    type=click.Choice(["ndjson", "csv"], case_sensitive=False),
+    default="ndjson",
+)
+@click.option(
+    "--output",
+    type=click.File("w"),
+    default="-",
+    help="Output file, stdout by default",
+)
 @click.option("-o", "--organization", prompt="Organization name", type=str)
 @click.option(
     "-t",
@@ -109,11 +160,42 @@ def vuln_alerts() -> None:
     confirmation_prompt=False,
     show_envvar=True,
 )
-def vulns_alerts_list(repos: str, organization: str, status: str, token: str) -> Dict:
-    """Get CodeQL alerts for one or several repositories"""
+def vulns_alerts_list(
+    repos: str,
+    organization: str,
+    status: str,
+    severity: str,
+    workers: int,
+    negative_cache: str,
+    negative_cache_ttl: int,
+    format: str,
+    output: Any,
+    token: str,
+) -> None:
+    """Get CodeQL alerts for one or several repositories
+
+    Alerts are written one per line as they are retrieved.
+    """
+
+    writer = export.StreamWriter(
+        output,
+        format=format,
+        fields=["repository", "number", "created_at", "state", "severity"],
+    )
+
+    def write_alerts(alerts) -> None:
+        for repository, alert_summary in alerts:
+            writer.write({"repository": repository, **alert_summary})
 
-    repositories_alerts = {}
     if repos == ("all",):
+        try:
+            write_alerts(
+                vulns.iter_codeql_alerts_org(organization, status, token, severity)
+            )
+            writer.flush()
+            return
+        except vulns.CodeScanningUnavailable:
+            logging.info("Falling back to listing the alerts per repository.")
         repos_list = repositories.get_org_repositories(
             status="all", organization=organization, token=token
         )
@@ -124,11 +206,46 @@ def vulns_alerts_list(repos: str, organization: str, status: str, token: str) ->
             r.name = rep
             repos_list.append(r)
 
-    repositories_alerts = vulns.get_codeql_alerts_repo(
-        repos_list, organization, status, token
+    write_alerts(
+        vulns.iter_codeql_alerts_repo(
+            repos_list,
+            organization,
+            status,
+            token,
+            severity,
+            workers=workers,
+            negative_cache=(
+                cache.JsonCache(negative_cache, ttl=negative_cache_ttl * 3600)
+                if negative_cache
+                else None
+            ),
+        )
     )
-    click.echo(repositories_alerts)
-    return repositories_alerts
+    writer.flush()
+
+
+@vuln_alerts.command("sync")
+@click.argument("store", type=click.Path(dir_okay=False))
+@click.option("-o", "--organization", prompt="Organization name", type=str)
+@click.option(
+    "-t",
+    "--token",
+    prompt=False,
+    type=str,
+    default=None,
+    hide_input=True,
+    confirmation_prompt=False,
+    show_envvar=True,
+)
+def vulns_alerts_sync(store: str, organization: str, token: str) -> None:
+    """Incrementally sync the organization CodeQL alerts to a local JSON store"""
+
+    changes = vulns.sync_codeql_alerts(organization, token, store)
+    if changes is False:
+        click.echo(f"Failure to sync the CodeQL alerts to {store}", err=True)
+        return
+
+    click.echo(changes)
 
 
 ################
@@ -188,6 +305,27 @@ def repositories_cli() -> None:
     type=bool,
     default=False,
 )
+@click.option(
+    "-p",
+    "--topic",
+    type=str,
+    default="",
+    help="Only repositories with this topic",
+)
+@click.option(
+    "-u",
+    "--pushed_after",
+    type=str,
+    default="",
+    help="Only repositories pushed to since YYYY-MM-DD",
+)
+@click.option(
+    "-k",
+    "--backend",
+    type=click.Choice(["listing", "search"], case_sensitive=False),
+    default="listing",
+    help="`search` filters server-side with the search API, `listing` walks all the repositories",
+)
 @click.option(
     "-f",
     "--format",
@@ -217,22 +355,32 @@ def repositories_list(
     license: str,
     archived: bool,
     disabled: bool,
+    topic: str,
+    pushed_after: str,
+    backend: str,
     format: str,
     output: Any,
     organization: str,
     token: str,
 ) -> None:
     """List repositories"""
-    res = repositories.get_org_repositories(
-        status,
-        organization,
-        token,
-        language,
-        default_branch,
-        license,
-        archived,
-        disabled,
-    )
+    try:
+        res = repositories.get_org_repositories(
+            status,
+            organization,
+            token,
+            language,
+            default_branch,
+            license,
+            archived,
+            disabled,
+            topic,
+            pushed_after,
+            backend,
+        )
+    except repositories.SearchUnavailable:
+        click.echo("The search failed, the repositories can't be listed.", err=True)
+        return
 
     if "human" == format:
         for r in res:
@@ -436,6 +584,64 @@ def repositories_create_dep_enforcement_pr(
     )
 
 
+@repositories_cli.command("create_onboarding_pr")
+@click.option(
+    "-r",
+    "--repository",
+    prompt="Repository name",
+)
+@click.option(
+    "-c",
+    "--codeql",
+    type=click.BOOL,
+    default=True,
+    prompt="Include CodeQL?",
+)
+@click.option(
+    "-d",
+    "--reviewer",
+    type=click.BOOL,
+    default=True,
+    prompt="Include the Dependency Reviewer?",
+)
+@click.option(
+    "-b",
+    "--branch",
+    prompt="Branch name to create",
+    default="appsec-ghas-onboarding",
+)
+@click.option(
+    "-t",
+    "--token",
+    prompt=False,
+    type=str,
+    default=None,
+    hide_input=True,
+    confirmation_prompt=False,
+    show_envvar=True,
+)
+@click.option("-o", "--organization", prompt="Organization name", type=str)
+def repositories_create_onboarding_pr(
+    repository: str,
+    codeql: bool,
+    reviewer: bool,
+    organization: str,
+    token: str,
+    branch: str,
+) -> None:
+    """Create a single PR bundling CodeQL and the Dependency reviewer"""
+    click.echo(
+        repositories.create_onboarding_pr(
+            organization,
+            token,
+            repository,
+            codeql=codeql,
+            reviewer=reviewer,
+            target_branch=branch,
+        )
+    )
+
+
 @repositories_cli.command("archivable")
 @click.option(
     "-f",
@@ -831,8 +1037,9 @@ def secret_alerts_cli() -> None:
     "-s",
     "--state",
     type=click.Choice(["open", "resolved"]),
-    default="open",
-    prompt="Secrets state",
+    default=["open"],
+    multiple=True,
+    help="Secrets state, can be repeated",
 )
 @click.argument("output_csv", type=click.File("a", lazy=True))
 @click.option(
@@ -849,7 +1056,6 @@ def secret_alerts_cli() -> None:
 @click.option(
     "-f",
     "--secrets-filter",
-    prompt=True,
     type=click.Choice(
         [
             "all",
@@ -871,20 +1077,217 @@ def secret_alerts_cli() -> None:
             "google_oauth_access_token",
         ]
     ),
-    default="all",
-    hide_input=False,
+    default=["all"],
+    multiple=True,
+    help="Secret type, can be repeated",
+)
+@click.option(
+    "-w",
+    "--workers",
+    type=int,
+    default=4,
+    help="Number of states and secret types fetched at once",
+)
+@click.option(
+    "-F",
+    "--format",
+    type=click.Choice(["csv", "ndjson"], case_sensitive=False),
+    default="csv",
+)
+@click.option(
+    "--resume",
+    is_flag=True,
+    default=False,
+    help="Continue an interrupted export from its checkpoint",
+)
+@click.option(
+    "--checkpoint",
+    type=click.Path(dir_okay=False),
+    default=None,
+    help="Checkpoint file, `<output>.checkpoint` by default",
+)
+@click.option(
+    "-l",
+    "--with-locations",
+    is_flag=True,
+    default=False,
+    help="Add the file and commit locations of each secret",
+)
+@click.option(
+    "--locations-cache",
+    type=click.Path(dir_okay=False),
+    default=None,
+    help="File keeping the locations of resolved secrets between runs",
 )
 def secret_alerts_export(
-    state: str, output_csv: Any, token: str, organization: str, secrets_filter: str
+    state: List,
+    output_csv: Any,
+    token: str,
+    organization: str,
+    secrets_filter: List,
+    workers: int,
+    format: str,
+    resume: bool,
+    checkpoint: str,
+    with_locations: bool,
+    locations_cache: str,
 ) -> None:
-    """Export secrets to a csv"""
+    """Export secrets to a csv, or NDJSON
 
-    secrets_list = secrets.export_secrets(state, token, organization, secrets_filter)
-    for secret in secrets_list:
-        output_csv.write(
-            f"{secret['state']}, {secret['resolution']}, {secret['resolved_at']}, {secret['repository_full_name']}, {secret['url']}, {secret['secret_type']}, {secret['secret']}\n"
+    Each state and secret type is fetched concurrently, filtered by the API.
+    The position of the export is checkpointed after each page,
+    so an interrupted export continues where it stopped with `--resume`.
+    """
+
+    states = sorted(set(state))
+    secret_types = [] if "all" in secrets_filter else sorted(set(secrets_filter))
+
+    if checkpoint is None:
+        checkpoint = f"{output_csv.name}.checkpoint"
+
+    cursors = {}
+    if resume:
+        progress = cache.load_json_file(checkpoint, {})
+        if (
+            progress.get("organization") == organization
+            and progress.get("states") == states
+            and progress.get("secret_types") == secret_types
+        ):
+            cursors = progress["cursors"]
+            logging.info(f"Resuming the export from {checkpoint}.")
+        else:
+            logging.warning(f"No matching checkpoint in {checkpoint}, starting over.")
+
+    fields = secrets.SECRET_FIELDS
+    if with_locations:
+        fields = fields + ["locations"]
+    writer = export.StreamWriter(
+        output_csv,
+        format=format,
+        fields=fields,
+        header=export.is_empty_output(output_csv),
+    )
+
+    # A page is checkpointed once all the secrets read before it are written,
+    # as secrets may still be waiting for their locations when the next page is read.
+    read = 0
+    written = 0
+    pages = deque()
+
+    def save_checkpoints() -> None:
+        if not pages or pages[0][0] > written:
+            return
+        writer.flush()
+        while pages and pages[0][0] <= written:
+            _, shard, next_cursor = pages.popleft()
+            cursors[shard] = next_cursor
+        cache.save_json_file(
+            checkpoint,
+            {
+                "organization": organization,
+                "states": states,
+                "secret_types": secret_types,
+                "cursors": cursors,
+            },
+        )
+
+    def on_page(shard: str, next_cursor: str) -> None:
+        pages.append((read, shard, next_cursor))
+        save_checkpoints()
+
+    def read_secrets() -> Any:
+        nonlocal read
+        for secret in secrets.iter_secret_alerts_sharded(
+            states,
+            token,
+            organization,
+            secret_types=secret_types,
+            workers=workers,
+            cursors=dict(cursors),
+            on_page=on_page,
+        ):
+            read += 1
+            yield secret
+
+    if with_locations:
+        locations_cache = cache.JsonCache(locations_cache)
+        secrets_stream = secrets.iter_secret_locations(
+            read_secrets(), token, workers=workers, locations_cache=locations_cache
+        )
+    else:
+        secrets_stream = ((secret, None) for secret in read_secrets())
+
+    try:
+        for secret, locations in secrets_stream:
+            record = secrets.summarize_secret(secret)
+            if with_locations:
+                record["locations"] = locations
+            writer.write(record)
+            written += 1
+            save_checkpoints()
+    except secrets.SecretScanningUnavailable:
+        writer.flush()
+        click.echo(
+            f"Export interrupted after {written} secrets. Run it again with --resume to continue.",
+            err=True,
         )
-    logging.info(f"Retrieved {len(secrets_list)} secrets.")
+        return
+    finally:
+        if with_locations:
+            locations_cache.save()
+
+    if os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    logging.info(f"Retrieved {written} secrets.")
+
+
+@secret_alerts_cli.command("sync")
+@click.argument("store", type=click.Path(dir_okay=False))
+@click.argument("output_csv", type=click.File("a", lazy=True))
+@click.option(
+    "-F",
+    "--format",
+    type=click.Choice(["csv", "ndjson"], case_sensitive=False),
+    default="csv",
+)
+@click.option(
+    "-t",
+    "--token",
+    prompt=False,
+    type=str,
+    default=None,
+    hide_input=True,
+    confirmation_prompt=False,
+    show_envvar=True,
+)
+@click.option("-o", "--organization", prompt="Organization name", type=str)
+def secret_alerts_sync(
+    store: str, output_csv: Any, format: str, token: str, organization: str
+) -> None:
+    """Append the new and changed secrets since the previous sync to a csv, or NDJSON
+
+    STORE is the local JSON store remembering the alerts and the sync watermark.
+    """
+
+    writer = export.StreamWriter(
+        output_csv,
+        format=format,
+        fields=secrets.SECRET_FIELDS,
+        header=export.is_empty_output(output_csv),
+    )
+
+    changes = secrets.sync_secret_alerts(
+        organization,
+        token,
+        store,
+        lambda secret: writer.write(secrets.summarize_secret(secret)),
+    )
+    writer.flush()
+    if changes is False:
+        click.echo(f"Failure to sync the secrets to {store}", err=True)
+        return
+
+    click.echo(changes)
 
 
 ##############
@@ -906,6 +1309,31 @@ def dependabot_alerts() -> None:
     type=str,
     multiple=True,
 )
+@click.option(
+    "-s",
+    "--state",
+    type=click.Choice(["open", "fixed", "dismissed", "auto_dismissed", ""]),
+    default="open",
+)
+@click.option(
+    "-c",
+    "--fields",
+    type=click.Choice(list(dependabot.ALERT_FIELDS.keys())),
+    multiple=True,
+    help="Fields to export. Full alerts by default, all the fields in CSV.",
+)
+@click.option(
+    "-f",
+    "--format",
+    type=click.Choice(["ndjson", "csv"], case_sensitive=False),
+    default="ndjson",
+)
+@click.option(
+    "--output",
+    type=click.File("w"),
+    default="-",
+    help="Output file, stdout by default",
+)
 @click.option(
     "-t",
     "--token",
@@ -919,38 +1347,76 @@ def dependabot_alerts() -> None:
 @click.option("-o", "--organization", prompt="Organization name", type=str)
 def dependabot_alerts_list(
     repos: List,
+    state: str,
+    fields: List,
+    format: str,
+    output: Any,
     organization: str,
     token: str,
 ) -> None:
-    """Get Dependabot alerts for a repository"""
+    """Get Dependabot alerts for a repository
+
+    Alerts are written one per line as they are retrieved.
+    """
 
+    if "csv" == format and not fields:
+        fields = list(dependabot.ALERT_FIELDS.keys())
+
+    writer = export.StreamWriter(output, format=format, fields=fields or None)
     for repo in repos:
-        dependabot_res = dependabot.list_alerts_repo(
+        for alert in dependabot.iter_alerts_repo(
             repository=repo,
             organization=organization,
             token=token,
-        )
-
-        for res in dependabot_res:
-            click.echo(res)
+            state=state,
+        ):
+            if fields:
+                alert = dependabot.project_alert(alert, fields)
+                alert["repository"] = repo
+            writer.write(alert)
+    writer.flush()
 
 
-@dependabot_alerts.command("get_dependencies")
+@dependabot_alerts.command("get_org_alerts")
 @click.option(
-    "-f",
-    "--format",
-    prompt="Output format",
-    type=click.Choice(
-        ["sbom", "csv", "txt"],
-        case_sensitive=True,
-    ),
-    default="sbom",
+    "-s",
+    "--state",
+    type=click.Choice(["open", "fixed", "dismissed", "auto_dismissed", ""]),
+    default="open",
 )
 @click.option(
-    "-r",
-    "--repository",
-    prompt="Repository name",
+    "-v",
+    "--severity",
+    type=click.Choice(["critical", "high", "medium", "low"]),
+    multiple=True,
+)
+@click.option(
+    "-e",
+    "--ecosystem",
+    type=str,
+    multiple=True,
+    help="Package ecosystem, e.g. `npm` or `pip`",
+)
+@click.option("-p", "--package", type=str, multiple=True, help="Package name")
+@click.option(
+    "--scope",
+    type=click.Choice(["", "development", "runtime"]),
+    default="",
+)
+@click.option(
+    "-c",
+    "--fields",
+    type=click.Choice(list(dependabot.ALERT_FIELDS.keys())),
+    multiple=True,
+    help="Fields to export. Full alerts by default, all the fields in CSV.",
 )
+@click.option(
+    "-f",
+    "--format",
+    type=click.Choice(["ndjson", "csv"], case_sensitive=False),
+    default="ndjson",
+)
+@click.argument("output", type=click.File("w"))
 @click.option(
     "-t",
     "--token",
@@ -962,16 +1428,343 @@ def dependabot_alerts_list(
     show_envvar=True,
 )
 @click.option("-o", "--organization", prompt="Organization name", type=str)
-def dependabot_get_dependencies(
-    repository: str, organization: str, token: str, format: str = "sbom"
+def dependabot_alerts_org(
+    state: str,
+    severity: List,
+    ecosystem: List,
+    package: List,
+    scope: str,
+    fields: List,
+    format: str,
+    output: Any,
+    organization: str,
+    token: str,
 ) -> None:
-    """Get a list of dependencies for a repository"""
+    """Export the Dependabot alerts of the whole organization, one alert per line"""
 
-    res = dependabot.get_dependencies(repository, organization, token, format=format)
-    click.echo(res, nl=False)
+    if "csv" == format and not fields:
+        fields = list(dependabot.ALERT_FIELDS.keys())
 
+    writer = export.StreamWriter(output, format=format, fields=fields or None)
+    for alert in dependabot.iter_alerts_org(
+        organization,
+        token,
+        state=state,
+        severity=severity,
+        ecosystem=ecosystem,
+        package=package,
+        scope=scope,
+    ):
+        if fields:
+            alert = dependabot.project_alert(alert, fields)
+        writer.write(alert)
+    writer.flush()
+    logging.info(f"Exported {writer.count} Dependabot alerts.")
 
-###########
+
+@dependabot_alerts.command("get_dependencies")
+@click.option(
+    "-f",
+    "--format",
+    prompt="Output format",
+    type=click.Choice(
+        ["sbom", "csv", "txt"],
+        case_sensitive=True,
+    ),
+    default="sbom",
+)
+@click.option(
+    "-r",
+    "--repository",
+    prompt="Repository name",
+)
+@click.option(
+    "-t",
+    "--token",
+    prompt=False,
+    type=str,
+    default=None,
+    hide_input=True,
+    confirmation_prompt=False,
+    show_envvar=True,
+)
+@click.option("-o", "--organization", prompt="Organization name", type=str)
+def dependabot_get_dependencies(
+    repository: str, organization: str, token: str, format: str = "sbom"
+) -> None:
+    """Get a list of dependencies for a repository"""
+
+    if "sbom" == format:
+        res = dependabot.get_dependencies(repository, organization, token, format=format)
+        click.echo(res, nl=False)
+        return
+
+    dependabot.get_dependencies(
+        repository,
+        organization,
+        token,
+        format=format,
+        output=click.get_text_stream("stdout"),
+    )
+
+
+##########
+# Alerts #
+##########
+
+
+@cli.group(name="alerts")
+def alerts_cli() -> None:
+    """Aggregate alerts across tools"""
+    pass
+
+
+@alerts_cli.command("summary")
+@click.option(
+    "-k",
+    "--tools",
+    type=click.Choice(["codeql", "dependabot", "secret_scanning"]),
+    multiple=True,
+    default=["codeql", "dependabot", "secret_scanning"],
+)
+@click.option(
+    "-m",
+    "--team-map",
+    type=click.File("r"),
+    default=None,
+    help="`team, repository` lines, e.g. the output of `mass set_developer_role`",
+)
+@click.option("-n", "--top", type=int, default=10)
+@click.option(
+    "--output",
+    type=click.File("w"),
+    default="-",
+    help="Output file, stdout by default",
+)
+@click.option(
+    "-t",
+    "--token",
+    prompt=False,
+    type=str,
+    default=None,
+    hide_input=True,
+    confirmation_prompt=False,
+    show_envvar=True,
+)
+@click.option("-o", "--organization", prompt="Organization name", type=str)
+def alerts_summary(
+    tools: List,
+    team_map: Any,
+    top: int,
+    output: Any,
+    organization: str,
+    token: str,
+) -> None:
+    """Count open alerts per severity and age, per repository and per team"""
+
+    columns = aggregation.AlertColumns()
+
+    if "codeql" in tools:
+        try:
+            aggregation.load_codeql_alerts(
+                columns, vulns.iter_codeql_alerts_org(organization, "open", token)
+            )
+        except vulns.CodeScanningUnavailable:
+            logging.error("Unable to retrieve the CodeQL alerts.")
+    if "dependabot" in tools:
+        aggregation.load_dependabot_alerts(
+            columns, dependabot.iter_alerts_org(organization, token, state="open")
+        )
+    if "secret_scanning" in tools:
+        try:
+            aggregation.load_secret_alerts(
+                columns, secrets.iter_secret_alerts("open", token, organization)
+            )
+        except secrets.SecretScanningUnavailable:
+            logging.error("Unable to retrieve all the secret scanning alerts.")
+    logging.info(f"Loaded {len(columns)} alerts.")
+
+    teams_repositories = {}
+    if team_map:
+        for line in team_map.readlines():
+            line = line.rstrip("\n").split(",")
+            if len(line) < 2:
+                continue
+            teams_repositories.setdefault(line[0].strip(" "), []).append(
+                line[1].strip(" ")
+            )
+
+    output.write(
+        json.dumps(
+            aggregation.summarize(columns, teams=teams_repositories, top=top),
+            indent=2,
+        )
+        + "\n"
+    )
+
+
+################
+# Dependencies #
+################
+
+
+@cli.group(name="dependencies")
+def dependencies_cli() -> None:
+    """Index and query the dependencies of the organization"""
+    pass
+
+
+@dependencies_cli.command("index")
+@click.argument("input_repos_list", type=click.File("r"))
+@click.argument("index", type=click.Path(dir_okay=False))
+@click.option(
+    "--refresh",
+    is_flag=True,
+    default=False,
+    help="Index all the repositories again, even if their default branch didn't move",
+)
+@click.option(
+    "-t",
+    "--token",
+    prompt=False,
+    type=str,
+    default=None,
+    hide_input=True,
+    confirmation_prompt=False,
+    show_envvar=True,
+)
+@click.option("-o", "--organization", prompt="Organization name", type=str)
+def dependencies_index(
+    input_repos_list: Any, index: str, refresh: bool, organization: str, token: str
+) -> None:
+    """Add or update repositories in a dependency index
+
+    Only the repositories whose default branch moved since they were indexed are fetched again.
+    """
+
+    repos_list = [repo.rstrip("\n") for repo in input_repos_list]
+    repos_list = [repo for repo in repos_list if repo]
+
+    dependencies = dependency_index.DependencyIndex(index)
+    heads = repositories.get_default_branch_heads(organization, token, repos_list)
+
+    updated = 0
+    for repo in repos_list:
+        head = heads.get(repo)
+        if not refresh and head and dependencies.get_head(repo) == head:
+            continue
+
+        sbom = dependabot.get_sbom(repo, organization, token)
+        if not sbom:
+            continue
+        count = dependencies.update(repo, sbom, head)
+        logging.info(f"{repo}: {count} packages indexed")
+        updated += 1
+
+    if not dependencies.save():
+        click.echo(f"Failure to write the dependency index to {index}", err=True)
+        return
+    click.echo(f"{updated} repositories indexed.")
+
+
+@dependencies_cli.command("query")
+@click.argument("index", type=click.Path(exists=True, dir_okay=False))
+@click.option(
+    "-e",
+    "--ecosystem",
+    prompt="Package ecosystem",
+    type=str,
+    help="Package ecosystem, e.g. `npm`, `pypi` or `maven`",
+)
+@click.option("-p", "--package", prompt="Package name", type=str)
+@click.option(
+    "-v",
+    "--versions",
+    type=str,
+    default="",
+    help="Version constraints, e.g. `>=2.0,<2.15.0`",
+)
+def dependencies_query(index: str, ecosystem: str, package: str, versions: str) -> None:
+    """List the repositories using a package, as `repository,version,license` lines"""
+
+    writer = csv.writer(click.get_text_stream("stdout"), lineterminator="\n")
+    for row in dependency_index.DependencyIndex(index).query(
+        ecosystem, package, versions
+    ):
+        writer.writerow(row)
+
+
+@dependencies_cli.command("licenses")
+@click.argument("input_repos_list", type=click.File("r"))
+@click.option(
+    "-w",
+    "--workers",
+    type=int,
+    default=1,
+    help="Number of SBOMs fetched at once",
+)
+@click.option(
+    "-c",
+    "--sbom-cache",
+    type=click.Path(file_okay=False),
+    default=None,
+    help="Directory caching the SBOMs per default branch head",
+)
+@click.option(
+    "--sbom-cache-size",
+    type=int,
+    default=512,
+    help="Maximum size of the SBOM cache, in MB",
+)
+@click.option(
+    "--output",
+    type=click.File("w"),
+    default="-",
+    help="Output file, stdout by default",
+)
+@click.option(
+    "-t",
+    "--token",
+    prompt=False,
+    type=str,
+    default=None,
+    hide_input=True,
+    confirmation_prompt=False,
+    show_envvar=True,
+)
+@click.option("-o", "--organization", prompt="Organization name", type=str)
+def dependencies_licenses(
+    input_repos_list: Any,
+    workers: int,
+    sbom_cache: str,
+    sbom_cache_size: int,
+    output: Any,
+    organization: str,
+    token: str,
+) -> None:
+    """Count the dependencies per license, per repository and per ecosystem
+
+    Repositories depending on copyleft licenses are listed separately.
+    """
+
+    repos_list = [repo.rstrip("\n") for repo in input_repos_list]
+    repos_list = [repo for repo in repos_list if repo]
+
+    fetch = dependabot.get_sbom_fetcher(
+        organization, token, repos_list, sbom_cache, sbom_cache_size
+    )
+
+    rollup = licenses.LicenseRollup()
+    for repo, sbom in dependabot.iter_sboms(
+        repos_list, fetch, workers=workers, ordered=False
+    ):
+        if sbom:
+            rollup.add(repo, sbom)
+
+    output.write(json.dumps(rollup.report(), indent=2) + "\n")
+
+
+###########
 # Actions #
 ###########
 
@@ -1191,6 +1984,20 @@ def mass_cli() -> None:
     type=click.BOOL,
     prompt="Deploy the Dependency Reviewer?",
 )
+@click.option(
+    "-g",
+    "--onboarding",
+    type=click.BOOL,
+    default=False,
+    prompt="Bundle CodeQL and the Dependency Reviewer in a single PR?",
+)
+@click.option(
+    "-e",
+    "--delta",
+    type=click.BOOL,
+    default=False,
+    prompt="Skip the features already deployed?",
+)
 @click.option(
     "-m",
     "--mend",
@@ -1198,6 +2005,13 @@ def mass_cli() -> None:
     default=False,
     prompt="Close Mend issues?",
 )
+@click.option(
+    "-i",
+    "--inventory",
+    type=click.File("r"),
+    default=None,
+    help="Repositories metadata, as exported by `repositories list --format json`",
+)
 @click.argument("input_repos_list", type=click.File("r"))
 @click.argument("output_csv", type=click.File("a", lazy=True))
 @click.option(
@@ -1218,7 +2032,10 @@ def mass_deploy(
     dependabot: bool,
     codeql: bool,
     reviewer: bool,
+    onboarding: bool,
+    delta: bool,
     mend: bool,
+    inventory: Any,
     input_repos_list: Any,
     output_csv: Any,
     organization: str,
@@ -1228,13 +2045,17 @@ def mass_deploy(
 
     repos_list = input_repos_list.readlines()
 
+    repos_inventory = {}
+    if inventory:
+        repos_inventory = repositories.load_inventory(inventory)
+
     template_secretscanner = template_loader.load_template("secret_scanner.md")
     template_pushprotection = template_loader.load_template("secret_scanner_push_protection.md")
     template_dependabot = template_loader.load_template("dependabot.md")
     template_codeql = template_loader.load_template("codeql.md")
 
     logging.info(
-        f"Enabling Actions ({actions_enable}), Secret Scanner ({secretscanner}), Push Protection ({pushprotection}), Dependabot ({dependabot}), CodeQL ({codeql}), Dependency Reviewer ({reviewer}) to {len(repos_list)} repositories."
+        f"Enabling Actions ({actions_enable}), Secret Scanner ({secretscanner}), Push Protection ({pushprotection}), Dependabot ({dependabot}), CodeQL ({codeql}), Dependency Reviewer ({reviewer}), Onboarding PR ({onboarding}), Delta ({delta}) to {len(repos_list)} repositories."
     )
 
     for repo in repos_list:
@@ -1253,6 +2074,68 @@ def mass_deploy(
 
         logging.info(f"{repo}....")
 
+        # Load the repository metadata once for all the steps
+        repo_context = repos_inventory.get(repo)
+        if repo_context is None and (codeql or reviewer or delta):
+            repo_context = repositories.get_repository(
+                organization, token, repo, languages=codeql
+            )
+            if not repo_context:
+                repo_context = None
+
+        # Only deploy the missing features
+        deployed = []
+        if delta and repo_context:
+            requested = [
+                feature
+                for feature, enabled in [
+                    ("secret_scanner", secretscanner),
+                    ("push_protection", pushprotection),
+                    ("dependabot", dependabot),
+                    ("codeql", codeql),
+                    ("reviewer", reviewer),
+                ]
+                if enabled
+            ]
+            deployed = repositories.get_deployed_features(
+                organization, token, repo_context, requested
+            )
+            logging.info(f"Already deployed: {deployed}")
+
+        if "secret_scanner" in deployed:
+            secretscanner_res = issue_secretscanner_res = "skipped"
+        if "push_protection" in deployed:
+            pushprotection_res = issue_pushprotection_res = "skipped"
+        if "dependabot" in deployed:
+            dependabot_res = issue_dependabot_res = "skipped"
+        if "codeql" in deployed:
+            codeql_res = issue_codeql_res = "skipped"
+        if "reviewer" in deployed:
+            reviewer_res = "skipped"
+        deploy_secretscanner = secretscanner and "secret_scanner" not in deployed
+        deploy_pushprotection = pushprotection and "push_protection" not in deployed
+        deploy_dependabot = dependabot and "dependabot" not in deployed
+        deploy_codeql = codeql and "codeql" not in deployed
+        deploy_reviewer = reviewer and "reviewer" not in deployed
+
+        # Without the deployed features, deploying would duplicate the existing ones and their issues
+        if delta and repo_context is None:
+            logging.error(
+                f"Unable to load {repo}, its features are marked as failed instead of being deployed."
+            )
+            if secretscanner:
+                secretscanner_res = False
+            if pushprotection:
+                pushprotection_res = False
+            if dependabot:
+                dependabot_res = False
+            if codeql:
+                codeql_res = False
+            if reviewer:
+                reviewer_res = False
+            deploy_secretscanner = deploy_pushprotection = deploy_dependabot = False
+            deploy_codeql = deploy_reviewer = False
+
         if actions_enable:
             actions_res = actions.set_permissions(
                 repository_name=repo,
@@ -1261,7 +2144,7 @@ def mass_deploy(
                 enabled=True,
                 allowed_actions="selected",
             )
-        if secretscanner:
+        if deploy_secretscanner:
             secretscanner_res = repositories.enable_secret_scanner(
                 organization, token, repo
             )
@@ -1273,7 +2156,7 @@ def mass_deploy(
                     organization=organization,
                     token=token,
                 )
-        if pushprotection:
+        if deploy_pushprotection:
             pushprotection_res = repositories.enable_secret_scanner_push_protection(
                 organization, token, repo
             )
@@ -1285,7 +2168,7 @@ def mass_deploy(
                     organization=organization,
                     token=token,
                 )
-        if dependabot:
+        if deploy_dependabot:
             dependabot_res = repositories.enable_dependabot(organization, token, repo)
             if dependabot_res != False:
                 issue_dependabot_res = issues.create(
@@ -1295,19 +2178,34 @@ def mass_deploy(
                     organization=organization,
                     token=token,
                 )
-        if codeql:
-            codeql_res = repositories.create_codeql_pr(organization, token, repo)
-            if codeql_res != False:
-                issue_codeql_res = issues.create(
-                    title="About Security code scanning",
-                    content=template_codeql,
-                    repository=repo,
-                    organization=organization,
-                    token=token,
-                )
-        if reviewer:
+        if onboarding and (deploy_codeql or deploy_reviewer):
+            onboarding_res = repositories.create_onboarding_pr(
+                organization,
+                token,
+                repo,
+                codeql=deploy_codeql,
+                reviewer=deploy_reviewer,
+                repo=repo_context,
+            )
+            if deploy_codeql:
+                codeql_res = onboarding_res
+            if deploy_reviewer:
+                reviewer_res = onboarding_res
+        elif deploy_codeql:
+            codeql_res = repositories.create_codeql_pr(
+                organization, token, repo, repo=repo_context
+            )
+        if deploy_codeql and codeql_res != False:
+            issue_codeql_res = issues.create(
+                title="About Security code scanning",
+                content=template_codeql,
+                repository=repo,
+                organization=organization,
+                token=token,
+            )
+        if deploy_reviewer and not onboarding:
             reviewer_res = repositories.create_dependency_enforcement_pr(
-                organization, token, repo
+                organization, token, repo, repo=repo_context
             )
 
         if mend:
@@ -1336,6 +2234,128 @@ def mass_deploy(
         )
 
 
+@mass_cli.command("configure")
+@click.option(
+    "-s",
+    "--secretscanner",
+    type=click.BOOL,
+    prompt="Enable Secret Scanner?",
+)
+@click.option(
+    "-p",
+    "--pushprotection",
+    type=click.BOOL,
+    prompt="Enable Push Protection?",
+)
+@click.option(
+    "-d",
+    "--dependabot",
+    type=click.BOOL,
+    prompt="Enable Dependabot?",
+)
+@click.option(
+    "-n",
+    "--name",
+    type=str,
+    default="ghas-cli",
+    prompt="Code security configuration name",
+)
+@click.option(
+    "-i",
+    "--inventory",
+    type=click.File("r"),
+    default=None,
+    help="Repositories metadata, as exported by `repositories list --format json`",
+)
+@click.argument("input_repos_list", type=click.File("r"))
+@click.argument("output_csv", type=click.File("a", lazy=True))
+@click.option(
+    "-t",
+    "--token",
+    prompt=False,
+    type=str,
+    default=None,
+    hide_input=True,
+    confirmation_prompt=False,
+    show_envvar=True,
+)
+@click.option("-o", "--organization", prompt="Organization name", type=str)
+def mass_configure(
+    secretscanner: bool,
+    pushprotection: bool,
+    dependabot: bool,
+    name: str,
+    inventory: Any,
+    input_repos_list: Any,
+    output_csv: Any,
+    organization: str,
+    token: str,
+) -> None:
+    """Enable GHAS features on a list of repositories with an organization code security configuration
+
+    The configuration replaces the previous configuration of the repositories.
+    Advanced Security is disabled on them unless the secret scanner or push protection is enabled.
+    """
+
+    repos_list = [repo.rstrip("\n") for repo in input_repos_list.readlines()]
+
+    # Resolve the repository IDs
+    repos_ids = {}
+    if inventory:
+        for repo in repositories.load_inventory(inventory).values():
+            if repo.id:
+                repos_ids[repo.name] = repo.id
+    if any(repo not in repos_ids for repo in repos_list):
+        for r in repositories.iter_org_repositories("all", organization, token):
+            repos_ids[r["name"]] = r["id"]
+
+    statuses = {}
+    configuration_id = code_security.set_configuration(
+        organization,
+        token,
+        code_security.build_configuration(
+            name, secretscanner, pushprotection, dependabot
+        ),
+    )
+    if configuration_id:
+        logging.info(
+            f"Attaching configuration {name} ({configuration_id}) to {len(repos_list)} repositories."
+        )
+        found_repos = [repo for repo in repos_list if repo in repos_ids]
+        if code_security.attach_configuration(
+            organization,
+            token,
+            configuration_id,
+            [repos_ids[repo] for repo in found_repos],
+        ):
+            statuses = code_security.wait_for_attachment(
+                organization, token, configuration_id, found_repos
+            )
+            missing = [
+                repo
+                for repo, status in statuses.items()
+                if status == code_security.MISSING_STATUS
+            ]
+            if missing:
+                logging.error(
+                    f"{len(missing)} repositories not attached to {name}: {', '.join(missing)}"
+                )
+
+    for repo in repos_list:
+        if repo not in repos_ids:
+            logging.error(f"{repo} not found in {organization}")
+        applied = statuses.get(repo) in code_security.APPLIED_STATUSES
+        secretscanner_res = applied if secretscanner else None
+        pushprotection_res = applied if pushprotection else None
+        dependabot_res = applied if dependabot else None
+
+        logging.info(f"{repo}: {statuses.get(repo)}")
+        # Same CSV columns as `mass deploy`
+        output_csv.write(
+            f"{organization},{repo},{None},{secretscanner_res}, {pushprotection_res}, {dependabot_res}, {None}, {None}, {None}, {None}, {None}, {None}, {0}\n"
+        )
+
+
 @mass_cli.command("archive")
 @click.argument("input_repos_list", type=click.File("r"))
 @click.option(
@@ -1538,6 +2558,13 @@ def mass_set_developer_role(
 
 
 @mass_cli.command("topics")
+@click.option(
+    "-i",
+    "--inventory",
+    type=click.File("r"),
+    default=None,
+    help="Repositories metadata, as exported by `repositories list --format json`",
+)
 @click.argument("input_repos_list", type=click.File("r"))
 @click.option(
     "-t",
@@ -1551,21 +2578,27 @@ def mass_set_developer_role(
 )
 @click.option("-o", "--organization", prompt="Organization name", type=str)
 def mass_get_topics(
+    inventory: Any,
     input_repos_list: Any,
     organization: str,
     token: str,
 ) -> None:
-    repos_list = input_repos_list.readlines()
+    repos_list = [repo.rstrip("\n") for repo in input_repos_list.readlines()]
 
-    for repo in repos_list:
-        repo = repo.rstrip("\n")
+    repos_inventory = {}
+    if inventory:
+        repos_inventory = repositories.load_inventory(inventory)
+
+    topics = repositories.get_topics_bulk(
+        token=token,
+        organization=organization,
+        repositories_names=repos_list,
+        inventory=repos_inventory,
+    )
 
+    for repo in repos_list:
         click.echo(f"{repo},", nl=False)
-        click.echo(
-            repositories.get_topics(
-                token=token, organization=organization, repository_name=repo
-            )
-        )
+        click.echo(topics[repo])
 
 
 @mass_cli.command("dependencies")
@@ -1591,25 +2624,127 @@ def mass_get_topics(
     ),
     default="csv",
 )
+@click.option(
+    "-c",
+    "--sbom-cache",
+    type=click.Path(file_okay=False),
+    default=None,
+    help="Directory caching the SBOMs per default branch head",
+)
+@click.option(
+    "--sbom-cache-size",
+    type=int,
+    default=512,
+    help="Maximum size of the SBOM cache, in MB",
+)
+@click.option(
+    "--refresh",
+    is_flag=True,
+    default=False,
+    help="Fetch all the SBOMs again, ignoring the cache",
+)
+@click.option(
+    "-w",
+    "--workers",
+    type=int,
+    default=1,
+    help="Number of SBOMs fetched at once",
+)
+@click.option(
+    "--completion-order",
+    is_flag=True,
+    default=False,
+    help="Write the repositories as soon as they are done instead of in input order",
+)
+@click.option(
+    "--output",
+    type=click.File("w"),
+    default="-",
+    help="Output file, stdout by default",
+)
+@click.option(
+    "--retry-list",
+    type=click.File("w"),
+    default=None,
+    help="File listing the repositories whose dependencies couldn't be retrieved",
+)
+@click.option(
+    "-s",
+    "--snapshot",
+    type=click.Path(dir_okay=False),
+    default=None,
+    help="File keeping the package set of each repository between two runs",
+)
+@click.option(
+    "-d",
+    "--delta",
+    type=click.File("w"),
+    default=None,
+    help="CSV file of the packages added, removed or updated since the snapshot",
+)
 def mass_get_dependencies(
     format: str,
     input_repos_list: Any,
     organization: str,
     token: str,
+    sbom_cache: str,
+    sbom_cache_size: int,
+    refresh: bool,
+    workers: int,
+    completion_order: bool,
+    output: Any,
+    retry_list: Any,
+    snapshot: str,
+    delta: Any,
 ) -> None:
-    repos_list = input_repos_list.readlines()
+    if delta and not snapshot:
+        raise click.UsageError("--delta requires a --snapshot file.")
 
-    for repo in repos_list:
-        repo = repo.rstrip("\n")
+    repos_list = [repo.rstrip("\n") for repo in input_repos_list]
+    repos_list = [repo for repo in repos_list if repo]
 
-        click.echo(f"{repo},", nl=False)
-        click.echo(
-            dependabot.get_dependencies(
-                repository=repo, organization=organization, token=token, format=format
-            ),
-            nl=False,
+    fetch = dependabot.get_sbom_fetcher(
+        organization, token, repos_list, sbom_cache, sbom_cache_size, refresh
+    )
+
+    if snapshot:
+        snapshot = dependency_snapshot.DependencySnapshot(snapshot)
+    if delta:
+        delta_writer = csv.writer(delta, lineterminator="\n")
+        delta_writer.writerow(
+            ["repository", "change", "package", "old_version", "new_version"]
         )
 
+    failed = 0
+    for repo, sbom in dependabot.iter_sboms(
+        repos_list, fetch, workers=workers, ordered=not completion_order
+    ):
+        if not sbom:
+            failed += 1
+            if retry_list:
+                retry_list.write(f"{repo}\n")
+                retry_list.flush()
+            continue
+
+        if "sbom" == format:
+            output.write(f"{repo},{json.dumps(sbom)}\n")
+        else:
+            # CSV rows already start with the repository
+            if "txt" == format:
+                output.write(f"{repo},")
+            dependabot.write_dependencies(sbom, repo, output, format)
+        output.flush()
+
+        if snapshot:
+            for change in snapshot.update(repo, sbom):
+                if delta:
+                    delta_writer.writerow([repo, *change])
+
+    if snapshot and not snapshot.save():
+        logging.error("Failure to write the dependency snapshot.")
+    if failed:
+        logging.warning(f"Unable to retrieve the dependencies of {failed} repositories.")
+
 
 if __name__ == "__main__":
     main()
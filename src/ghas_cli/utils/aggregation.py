@@ -0,0 +1,280 @@
+# -*- coding: utf-8 -*-
+#!/usr/bin/env python3
+"""Columnar aggregation of security alerts.
+
+Alerts are stored as dictionary-encoded columns in compact `array` buffers.
+Group-by counts and percentiles are vectorized with NumPy when it is installed,
+and computed with plain Python otherwise.
+"""
+
+import datetime
+import math
+from array import array
+from collections import Counter
+from typing import Any, Dict, List, Tuple
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Upper bound (in days, exclusive) and label of each age bucket
+AGE_BUCKETS = [
+    (7, "0-7d"),
+    (30, "7-30d"),
+    (90, "30-90d"),
+    (365, "90-365d"),
+    (math.inf, "365d+"),
+]
+
+
+def parse_date(date: str) -> datetime.datetime:
+    """Parse a GitHub API timestamp"""
+    return datetime.datetime.strptime(date[:19], "%Y-%m-%dT%H:%M:%S")
+
+
+def get_age_bucket(age: float) -> int:
+    """Return the index of the age bucket of an age in days"""
+    for index, (upper_bound, _) in enumerate(AGE_BUCKETS):
+        if age < upper_bound:
+            return index
+    return len(AGE_BUCKETS) - 1
+
+
+def percentile(values: List, q: float) -> float:
+    """Percentile with linear interpolation, like numpy.percentile"""
+    if not values:
+        return math.nan
+    values = sorted(values)
+    position = (len(values) - 1) * q / 100
+    lower = math.floor(position)
+    upper = math.ceil(position)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+class Categories:
+    """Dictionary encoding of a string column"""
+
+    def __init__(self):
+        self.values: List[str] = []
+        self.codes: Dict[str, int] = {}
+
+    def encode(self, value: str) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            code = len(self.values)
+            self.codes[value] = code
+            self.values.append(value)
+        return code
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+
+class AlertColumns:
+    """Alerts loaded into compact columnar arrays, one row per alert"""
+
+    COLUMNS = ["tool", "repository", "severity", "age_bucket"]
+
+    def __init__(self, now: datetime.datetime = None):
+        self.now = now or datetime.datetime.now(datetime.timezone.utc).replace(
+            tzinfo=None
+        )
+        self.categories = {
+            "tool": Categories(),
+            "repository": Categories(),
+            "severity": Categories(),
+        }
+        self.columns = {
+            "tool": array("B"),
+            "repository": array("I"),
+            "severity": array("B"),
+            "age_bucket": array("B"),
+        }
+        self.age = array("f")
+
+    def append(self, tool: str, repository: str, severity: str, created_at: str) -> None:
+        age = (self.now - parse_date(created_at)).total_seconds() / 86400
+        self.columns["tool"].append(self.categories["tool"].encode(tool))
+        self.columns["repository"].append(
+            self.categories["repository"].encode(repository)
+        )
+        self.columns["severity"].append(
+            self.categories["severity"].encode(severity or "unknown")
+        )
+        self.columns["age_bucket"].append(get_age_bucket(age))
+        self.age.append(age)
+
+    def __len__(self) -> int:
+        return len(self.age)
+
+    def decode(self, column: str, code: int) -> str:
+        if "age_bucket" == column:
+            return AGE_BUCKETS[code][1]
+        return self.categories[column].values[code]
+
+    def cardinality(self, column: str) -> int:
+        if "age_bucket" == column:
+            return len(AGE_BUCKETS)
+        return max(len(self.categories[column]), 1)
+
+    def group_counts(self, keys: List[str]) -> Dict[Tuple, int]:
+        """Count the alerts per combination of `keys` columns"""
+        if not len(self):
+            return {}
+
+        if numpy is not None:
+            combined = numpy.zeros(len(self), dtype=numpy.int64)
+            for key in keys:
+                combined = combined * self.cardinality(key) + numpy.frombuffer(
+                    self.columns[key], dtype=self.columns[key].typecode
+                )
+            codes, counts = numpy.unique(combined, return_counts=True)
+            groups = {}
+            for code, count in zip(codes.tolist(), counts.tolist()):
+                group = []
+                for key in reversed(keys):
+                    code, key_code = divmod(code, self.cardinality(key))
+                    group.append(self.decode(key, key_code))
+                groups[tuple(reversed(group))] = count
+            return groups
+
+        counts = Counter(zip(*[self.columns[key] for key in keys]))
+        return {
+            tuple(self.decode(key, code) for key, code in zip(keys, group)): count
+            for group, count in counts.items()
+        }
+
+    def age_percentiles(self, percentiles: List, by: str = None) -> Dict:
+        """Age percentiles in days, overall or per value of the `by` column"""
+        if not len(self):
+            return {}
+
+        if by is None:
+            groups = {"all": None}
+        else:
+            groups = {
+                self.decode(by, code): code for code in range(self.cardinality(by))
+            }
+
+        results = {}
+        if numpy is not None:
+            ages = numpy.frombuffer(self.age, dtype=numpy.float32)
+            for name, code in groups.items():
+                selected = ages
+                if code is not None:
+                    column = numpy.frombuffer(
+                        self.columns[by], dtype=self.columns[by].typecode
+                    )
+                    selected = ages[column == code]
+                if len(selected):
+                    results[name] = dict(
+                        zip(
+                            percentiles,
+                            numpy.percentile(selected, percentiles).tolist(),
+                        )
+                    )
+            return results
+
+        for name, code in groups.items():
+            if code is None:
+                selected = list(self.age)
+            else:
+                selected = [
+                    age for age, value in zip(self.age, self.columns[by]) if value == code
+                ]
+            if selected:
+                results[name] = {q: percentile(selected, q) for q in percentiles}
+        return results
+
+    def top_repositories(self, n: int) -> List:
+        """The `n` repositories with the most alerts"""
+        if numpy is not None and len(self):
+            counts = numpy.bincount(
+                numpy.frombuffer(self.columns["repository"], dtype=numpy.uint32),
+                minlength=self.cardinality("repository"),
+            )
+            top = numpy.argsort(-counts, kind="stable")[:n]
+            return [
+                (self.decode("repository", code), int(counts[code]))
+                for code in top.tolist()
+                if counts[code]
+            ]
+
+        counts = Counter(self.columns["repository"])
+        return [
+            (self.decode("repository", code), count)
+            for code, count in counts.most_common(n)
+        ]
+
+
+def load_codeql_alerts(columns: AlertColumns, alerts: Any) -> None:
+    """Load (repository, alert summary) pairs from `vulns.iter_codeql_alerts_org`"""
+    for repository, alert_summary in alerts:
+        columns.append(
+            "codeql", repository, alert_summary["severity"], alert_summary["created_at"]
+        )
+
+
+def load_dependabot_alerts(columns: AlertColumns, alerts: Any) -> None:
+    """Load raw Dependabot alerts"""
+    for alert in alerts:
+        columns.append(
+            "dependabot",
+            alert["repository"]["name"],
+            alert["security_advisory"]["severity"],
+            alert["created_at"],
+        )
+
+
+def load_secret_alerts(columns: AlertColumns, alerts: Any) -> None:
+    """Load raw secret scanning alerts, which have no severity"""
+    for alert in alerts:
+        columns.append(
+            "secret_scanning", alert["repository"]["name"], "secret", alert["created_at"]
+        )
+
+
+def summarize(columns: AlertColumns, teams: Dict = {}, top: int = 10) -> Dict:
+    """
+    Roll the alerts up per tool, severity and age bucket, overall, per repository and per team.
+
+    `teams` maps each team to the list of its repositories.
+    """
+    keys = ["tool", "severity", "age_bucket"]
+    per_repository = columns.group_counts(["repository"] + keys)
+
+    repositories_rows = {}
+    for (repository, *group), count in per_repository.items():
+        repositories_rows.setdefault(repository, Counter())[tuple(group)] += count
+
+    teams_rows = {}
+    for team, team_repositories in teams.items():
+        team_counts = Counter()
+        for repository in team_repositories:
+            team_counts.update(repositories_rows.get(repository, {}))
+        if team_counts:
+            teams_rows[team] = team_counts
+
+    def rows(counts: Dict) -> List:
+        return [
+            dict(zip(keys, group), count=count)
+            for group, count in sorted(counts.items())
+        ]
+
+    return {
+        "total": len(columns),
+        "overall": rows(columns.group_counts(keys)),
+        "age_percentiles": {
+            tool: {q: round(age, 1) for q, age in ages.items()}
+            for tool, ages in columns.age_percentiles([50, 90, 99], by="tool").items()
+        },
+        "top_repositories": [
+            {"repository": repository, "count": count}
+            for repository, count in columns.top_repositories(top)
+        ],
+        "repositories": {
+            repository: rows(counts) for repository, counts in repositories_rows.items()
+        },
+        "teams": {team: rows(counts) for team, counts in teams_rows.items()},
+    }
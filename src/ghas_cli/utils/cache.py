@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+#!/usr/bin/env python3
+
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any
+
+
+def load_json_file(location: str, default: Any) -> Any:
+    """Load a JSON file, or return `default` if it doesn't exist or is unreadable"""
+    if not location or not os.path.exists(location):
+        return default
+
+    try:
+        with open(location, "r") as json_file:
+            return json.load(json_file)
+    except (OSError, ValueError) as e:
+        logging.warning(f"Ignoring unreadable file {location}: {e}")
+        return default
+
+
+def save_json_file(location: str, data: Any, compact: bool = False) -> bool:
+    """Atomically write a JSON file, without whitespace if `compact`"""
+    try:
+        tmp_location = f"{location}.tmp"
+        with open(tmp_location, "w") as json_file:
+            json.dump(data, json_file, separators=(",", ":") if compact else None)
+        os.replace(tmp_location, location)
+    except OSError as e:
+        logging.error(f"Failure to write {location}: {e}")
+        return False
+    return True
+
+
+class JsonCache:
+    """Key/value cache persisted as a JSON file, with an optional time to live in seconds"""
+
+    def __init__(self, location: str, ttl: int = None):
+        self.location = location
+        self.ttl = ttl
+        self.entries = load_json_file(location, {})
+        self.lock = threading.Lock()
+
+    def get(self, key: str) -> Any:
+        """Return the cached value, or None if missing or expired"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            stored_at, value = entry
+            if self.ttl is not None and time.time() - stored_at > self.ttl:
+                del self.entries[key]
+                return None
+            return value
+
+    def set(self, key: str, value: Any) -> None:
+        with self.lock:
+            self.entries[key] = [time.time(), value]
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key) is not None
+
+    def save(self) -> bool:
+        """Write the cache back to disk"""
+        if not self.location:
+            return False
+
+        with self.lock:
+            return save_json_file(self.location, self.entries)
+
+
+class VersionedFileCache:
+    """
+    One JSON file per key and version, in a directory bounded to `max_bytes`.
+
+    Each key keeps a single version: storing a new one removes the previous files.
+    When the directory grows over `max_bytes`, the least recently used files are evicted.
+    """
+
+    SUFFIX = ".json"
+
+    def __init__(self, directory: str, max_bytes: int = None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key: str, version: str) -> str:
+        # `@` can't appear in repository names, so it separates the key from the version
+        return os.path.join(self.directory, f"{key}@{version}{self.SUFFIX}")
+
+    def get(self, key: str, version: str) -> Any:
+        """Return the cached value of this version of `key`, or None"""
+        location = self.path(key, version)
+        value = load_json_file(location, None)
+        if value is not None:
+            # Mark as recently used for the eviction
+            try:
+                os.utime(location)
+            except OSError:
+                pass
+        return value
+
+    def set(self, key: str, version: str, value: Any) -> bool:
+        with self.lock:
+            prefix = f"{key}@"
+            for name in os.listdir(self.directory):
+                if name.startswith(prefix) and name.endswith(self.SUFFIX):
+                    os.remove(os.path.join(self.directory, name))
+
+            if not save_json_file(self.path(key, version), value):
+                return False
+            self.evict()
+        return True
+
+    def evict(self) -> None:
+        """Remove the least recently used files until the directory fits in `max_bytes`"""
+        if self.max_bytes is None:
+            return
+
+        entries = []
+        total = 0
+        for name in os.listdir(self.directory):
+            if not name.endswith(self.SUFFIX):
+                continue
+            stat = os.stat(os.path.join(self.directory, name))
+            entries.append((stat.st_mtime, stat.st_size, name))
+            total += stat.st_size
+
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(os.path.join(self.directory, name))
+            total -= size
@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+#!/usr/bin/env python3
+
+import logging
+import time
+from typing import Any, Dict, List
+
+from . import network
+from .validation import validate_organization_name
+
+# Statuses of a repository still being processed after an attachment
+PENDING_STATUSES = ["attaching", "updating"]
+
+# Statuses of a repository on which the configuration is applied
+APPLIED_STATUSES = ["attached", "enforced"]
+
+# Status of a repository missing from the configuration repositories
+MISSING_STATUS = "missing"
+
+# Number of repository IDs sent per attachment request
+ATTACH_BATCH_SIZE = 1000
+
+# Sleep x seconds between two attachment status checks
+ATTACH_POLL_INTERVAL = 10
+
+# Number of attachment status checks before giving up
+ATTACH_POLL_RETRIES = 30
+
+
+def build_configuration(
+    name: str,
+    secret_scanner: bool,
+    push_protection: bool,
+    dependabot: bool,
+) -> Dict:
+    """
+    Build a code security configuration payload.
+
+    Requested features are enabled, the others and every setting we don't manage are sent as `not_set`,
+    as omitted settings take the API defaults, mostly `disabled`. The configuration is unenforced.
+    `advanced_security` has no `not_set` value: it's `disabled` without secret scanning,
+    and attaching the configuration replaces the previous configuration of the repositories.
+    """
+
+    def setting(enabled: bool) -> str:
+        return "enabled" if enabled else "not_set"
+
+    secrets = secret_scanner or push_protection
+    return {
+        "name": name,
+        "description": "Managed by ghas-cli",
+        "advanced_security": "enabled" if secrets else "disabled",
+        "dependency_graph": setting(dependabot),
+        "dependency_graph_autosubmit_action": "not_set",
+        "dependabot_alerts": setting(dependabot),
+        "dependabot_security_updates": setting(dependabot),
+        "code_scanning_default_setup": "not_set",
+        "secret_scanning": setting(secrets),
+        "secret_scanning_push_protection": setting(push_protection),
+        "secret_scanning_validity_checks": "not_set",
+        "secret_scanning_non_provider_patterns": "not_set",
+        "private_vulnerability_reporting": "not_set",
+        "enforcement": "unenforced",
+    }
+
+
+def get_configuration_id(organization: str, token: str, name: str) -> Any:
+    """Get the ID of an organization code security configuration by name"""
+    headers = network.get_github_headers(token)
+
+    params = {"target_type": "organization", "per_page": 100}
+    while True:
+        configurations = network.get(
+            url=f"https://api.github.com/orgs/{organization}/code-security/configurations",
+            params=params,
+            headers=headers,
+        )
+        if configurations.status_code != 200:
+            return False
+
+        for configuration in configurations.json():
+            if configuration["name"] == name:
+                return configuration["id"]
+
+        cursor = network.get_next_cursor(configurations)
+        if not cursor:
+            return None
+        params["after"] = cursor
+
+
+def set_configuration(organization: str, token: str, configuration: Dict) -> Any:
+    """Create or update an organization code security configuration. Returns its ID"""
+    validate_organization_name(organization)
+    headers = network.get_github_headers(token)
+
+    configuration_id = get_configuration_id(
+        organization, token, configuration["name"]
+    )
+    if configuration_id is False:
+        return False
+
+    if configuration_id is None:
+        configuration_resp = network.post(
+            url=f"https://api.github.com/orgs/{organization}/code-security/configurations",
+            headers=headers,
+            json=configuration,
+        )
+        if configuration_resp.status_code != 201:
+            logging.error(
+                f"Failure to create the configuration: {configuration_resp.status_code} - {configuration_resp.content}"
+            )
+            return False
+    else:
+        configuration_resp = network.patch(
+            url=f"https://api.github.com/orgs/{organization}/code-security/configurations/{configuration_id}",
+            headers=headers,
+            json=configuration,
+        )
+        if configuration_resp.status_code != 200:
+            logging.error(
+                f"Failure to update the configuration: {configuration_resp.status_code} - {configuration_resp.content}"
+            )
+            return False
+
+    return configuration_resp.json()["id"]
+
+
+def attach_configuration(
+    organization: str, token: str, configuration_id: int, repository_ids: List
+) -> bool:
+    """Attach a code security configuration to a list of repository IDs"""
+    headers = network.get_github_headers(token)
+
+    for i in range(0, len(repository_ids), ATTACH_BATCH_SIZE):
+        payload = {
+            "scope": "selected",
+            "selected_repository_ids": repository_ids[i : i + ATTACH_BATCH_SIZE],
+        }
+        attach_resp = network.post(
+            url=f"https://api.github.com/orgs/{organization}/code-security/configurations/{configuration_id}/attach",
+            headers=headers,
+            json=payload,
+        )
+        if attach_resp.status_code != 202:
+            logging.error(
+                f"Failure to attach the configuration: {attach_resp.status_code} - {attach_resp.content}"
+            )
+            return False
+
+    return True
+
+
+def get_attachment_status(
+    organization: str, token: str, configuration_id: int
+) -> Dict:
+    """Get the attachment status of each repository attached to a configuration, or None on failure"""
+    headers = network.get_github_headers(token)
+
+    statuses = {}
+    params = {"per_page": 100}
+    while True:
+        repos = network.get(
+            url=f"https://api.github.com/orgs/{organization}/code-security/configurations/{configuration_id}/repositories",
+            params=params,
+            headers=headers,
+        )
+        if repos.status_code != 200:
+            logging.error(
+                f"Unable to retrieve the attachment status - {repos.status_code} - {repos.content}"
+            )
+            return None
+
+        for repo in repos.json():
+            statuses[repo["repository"]["name"]] = repo["status"]
+
+        cursor = network.get_next_cursor(repos)
+        if not cursor:
+            break
+        params["after"] = cursor
+
+    return statuses
+
+
+def wait_for_attachment(
+    organization: str, token: str, configuration_id: int, repositories: List
+) -> Dict:
+    """
+    Poll the attachment status until none of the repositories is pending.
+
+    Repositories that never appear in the configuration repositories are reported as `missing`.
+    """
+    statuses = {}
+    for _ in range(ATTACH_POLL_RETRIES):
+        listed = get_attachment_status(organization, token, configuration_id)
+        if listed is not None:
+            statuses = listed
+            pending = [
+                repo
+                for repo in repositories
+                if statuses.get(repo, MISSING_STATUS) in PENDING_STATUSES
+            ]
+            if not pending:
+                break
+            logging.info(f"Waiting for {len(pending)} repositories to be attached...")
+
+        time.sleep(ATTACH_POLL_INTERVAL)
+
+    return {repo: statuses.get(repo, MISSING_STATUS) for repo in repositories}
@@ -1,28 +1,65 @@
 # -*- coding: utf-8 -*-
 #!/usr/bin/env python3
 
-import json
+import csv
+import io
+import itertools
 import logging
-from typing import List
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterator, List
 
 import requests
 
 from . import network
+from .cache import VersionedFileCache
+from .repositories import get_default_branch_heads
 
+# Exportable alert fields, and their path in the API alert
+ALERT_FIELDS = {
+    "repository": ["repository", "name"],
+    "number": ["number"],
+    "package": ["dependency", "package", "name"],
+    "ecosystem": ["dependency", "package", "ecosystem"],
+    "manifest": ["dependency", "manifest_path"],
+    "severity": ["security_advisory", "severity"],
+    "ghsa_id": ["security_advisory", "ghsa_id"],
+    "cve_id": ["security_advisory", "cve_id"],
+    "state": ["state"],
+    "created_at": ["created_at"],
+    "updated_at": ["updated_at"],
+    "fixed_at": ["fixed_at"],
+    "dismissed_at": ["dismissed_at"],
+    "html_url": ["html_url"],
+}
 
-def list_alerts_repo(repository: str, organization: str, token: str) -> List:
-    """Get Dependabot alerts for one repository"""
+
+def project_alert(alert: Dict, fields: List) -> Dict:
+    """Keep only `fields` of an alert, flattened. See `ALERT_FIELDS`."""
+    record = {}
+    for field in fields:
+        value = alert
+        for key in ALERT_FIELDS[field]:
+            value = value.get(key) if isinstance(value, dict) else None
+        record[field] = value
+    return record
+
+
+def iter_alerts_repo(
+    repository: str, organization: str, token: str, state: str = "open"
+) -> Iterator:
+    """Iterate over the Dependabot alerts of one repository, page by page"""
 
     headers = network.get_github_headers(token)
 
-    alerts_repo = []
-    page = 1
+    url = f"https://api.github.com/repos/{organization}/{repository}/dependabot/alerts"
+    # An empty cursor asks for cursor-based pagination
+    params = {"state": state, "per_page": 100, "after": ""}
     while True:
         i = 0
         while i < network.RETRIES:
-            params = {"state": "open", "per_page": 100, "page": page}
             alerts = requests.get(
-                url=f"https://api.github.com/repos/{organization}/{repository}/dependabot/alerts",
+                url=url,
                 params=params,
                 headers=headers,
             )
@@ -33,61 +70,278 @@ def list_alerts_repo(repository: str, organization: str, token: str) -> List:
 
         if alerts.status_code != 200:
             break
-        if not alerts.json():
+
+        page = alerts.json()
+        if not page:
             break
-        for a in alerts.json():
+        for a in page:
             if not a:
                 continue
-            alerts_repo.append(json.dumps(a))
-        page += 1
+            yield a
 
-    return alerts_repo
+        next_page = network.get_next_page(alerts, url, params)
+        if next_page is None:
+            break
+        url, params = next_page
 
 
+def build_alerts_params(
+    state: str = "open",
+    severity: List = [],
+    ecosystem: List = [],
+    package: List = [],
+    scope: str = "",
+) -> Dict:
+    """Query parameters filtering Dependabot alerts server-side. Lists are sent comma-separated."""
+    params = {"per_page": 100}
+    if state:
+        params["state"] = state
+    if severity:
+        params["severity"] = ",".join(severity)
+    if ecosystem:
+        params["ecosystem"] = ",".join(ecosystem)
+    if package:
+        params["package"] = ",".join(package)
+    if scope:
+        params["scope"] = scope
+    return params
 
-def get_dependencies(repository: str, organization: str, token: str, format:str ="sbom"):
-    """
-    Get the list of dependencies for one repository.
 
-    Available formats:
-    - `sbom` - SPDX json
-    - `CSV` - CSV export
-    - `txt` - basic export
+def iter_alerts_org(
+    organization: str,
+    token: str,
+    state: str = "open",
+    severity: List = [],
+    ecosystem: List = [],
+    package: List = [],
+    scope: str = "",
+) -> Iterator:
+    """
+    Iterate over the Dependabot alerts of a whole organization, following the `after` cursors.
 
-    https://docs.github.com/en/rest/dependency-graph/sboms?apiVersion=2022-11-28
+    Filters are applied by the API, see `build_alerts_params`.
     """
+
     headers = network.get_github_headers(token)
 
-    dependencies = requests.get(
-                url=f"https://api.github.com/repos/{organization}/{repository}/dependency-graph/sbom",
+    url = f"https://api.github.com/orgs/{organization}/dependabot/alerts"
+    params = build_alerts_params(state, severity, ecosystem, package, scope)
+    # An empty cursor asks for cursor-based pagination
+    params["after"] = ""
+    while True:
+        i = 0
+        while i < network.RETRIES:
+            alerts = requests.get(
+                url=url,
+                params=params,
                 headers=headers,
             )
+            if network.check_rate_limit(alerts):
+                i += 1
+            else:
+                break
+
+        if alerts.status_code != 200:
+            logging.error(
+                f"Unable to retrieve the Dependabot alerts for {organization} - {alerts.status_code} - {alerts.content}"
+            )
+            break
 
+        for a in alerts.json():
+            if not a:
+                continue
+            yield a
+
+        next_page = network.get_next_page(alerts, url, params)
+        if next_page is None:
+            break
+        url, params = next_page
+
+
+def get_sbom(repository: str, organization: str, token: str) -> Any:
+    """
+    Get the SPDX SBOM of one repository, or False on failure.
+
+    https://docs.github.com/en/rest/dependency-graph/sboms?apiVersion=2022-11-28
+    """
+    headers = network.get_github_headers(token)
+
+    dependencies = requests.get(
+        url=f"https://api.github.com/repos/{organization}/{repository}/dependency-graph/sbom",
+        headers=headers,
+    )
 
     if dependencies.status_code != 200:
-        logging.error(f"Unable to retrieve the dependencies for {repository} - {dependencies.status_code} - {dependencies.content}")
+        logging.error(
+            f"Unable to retrieve the dependencies for {repository} - {dependencies.status_code} - {dependencies.content}"
+        )
         return False
 
-    if "sbom" == format:
-        return dependencies.json()
-    elif "csv" == format:
-        deps = ""
-        for dep in dependencies.json()["sbom"]["packages"]:
+    return dependencies.json()
+
+
+def get_sbom_cached(
+    repository: str,
+    organization: str,
+    token: str,
+    sbom_cache: VersionedFileCache,
+    head_sha: str = None,
+    refresh: bool = False,
+) -> Any:
+    """
+    Get the SBOM of one repository through a cache keyed by its default branch head SHA.
+
+    The SBOM is only fetched if the head moved since it was cached, or if `refresh` is set.
+    Without a known head, the SBOM is fetched and not cached.
+    """
+    if not head_sha:
+        return get_sbom(repository, organization, token)
+
+    if not refresh:
+        sbom = sbom_cache.get(repository, head_sha)
+        if sbom is not None:
+            logging.info(f"{repository}: SBOM cached at {head_sha}")
+            return sbom
+
+    sbom = get_sbom(repository, organization, token)
+    if sbom:
+        sbom_cache.set(repository, head_sha, sbom)
+    return sbom
+
+
+def get_sbom_fetcher(
+    organization: str,
+    token: str,
+    repositories_names: List,
+    sbom_cache: str = None,
+    sbom_cache_size: int = 512,
+    refresh: bool = False,
+) -> Callable:
+    """
+    Return a `fetch(repository)` function getting the SBOM of a repository, e.g. for `iter_sboms`.
+
+    With a `sbom_cache` directory, bounded to `sbom_cache_size` MB, the default branch heads
+    of `repositories_names` are resolved in bulk, and SBOMs go through `get_sbom_cached`.
+    """
+    if not sbom_cache:
+        return lambda repository: get_sbom(repository, organization, token)
+
+    cache = VersionedFileCache(sbom_cache, max_bytes=sbom_cache_size * 1024 * 1024)
+    heads = get_default_branch_heads(organization, token, repositories_names)
+
+    def fetch(repository: str) -> Any:
+        return get_sbom_cached(
+            repository, organization, token, cache, heads.get(repository), refresh
+        )
+
+    return fetch
+
+
+def iter_sboms(
+    repositories_names: List, fetch: Callable, workers: int = 1, ordered: bool = True
+) -> Iterator:
+    """
+    Fetch the SBOMs of several repositories with `fetch(repository)`, `workers` at a time.
+
+    Yields (repository, SBOM or False) in input order, or in completion order if not `ordered`.
+    At most twice `workers` fetches are pending, so results waiting for their turn stay bounded.
+    """
+    workers = max(workers, 1)
+    names = iter(repositories_names)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for name in itertools.islice(names, 2 * workers):
+            pending.append((name, executor.submit(fetch, name)))
+
+        while pending:
+            if ordered:
+                name, future = pending.popleft()
+            else:
+                wait([future for _, future in pending], return_when=FIRST_COMPLETED)
+                name, future = next(
+                    (name, future) for name, future in pending if future.done()
+                )
+                pending.remove((name, future))
+
             try:
-                license = dep['licenseConcluded']
-            except (KeyError, TypeError):
-                try:
-                    license = dep['licenseDeclared']
-                except (KeyError, TypeError):
-                    license = "Unknown"
-
-            deps += f"{repository}, {dep['name']},{dep['versionInfo']}, {license}\n"
-        return deps
+                sbom = future.result()
+            except Exception as e:
+                logging.error(f"Unable to retrieve the dependencies for {name} - {e}")
+                sbom = False
+
+            for next_name in itertools.islice(names, 1):
+                pending.append((next_name, executor.submit(fetch, next_name)))
+
+            yield name, sbom
+
+
+def get_package_license(package: Dict) -> str:
+    """The concluded, or else declared, license of an SBOM package"""
+    return package.get("licenseConcluded") or package.get("licenseDeclared") or "Unknown"
+
+
+def write_dependencies(sbom: Dict, repository: str, output: Any, format: str = "csv") -> bool:
+    """
+    Write the packages of an SBOM to `output`, one row at a time.
+
+    Available formats:
+    - `csv` - repository, package, version, license
+    - `txt` - package names
+    """
+    if "csv" == format:
+        writer = csv.writer(output, lineterminator="\n")
+        for package in sbom["sbom"]["packages"]:
+            writer.writerow(
+                [
+                    repository,
+                    package["name"],
+                    package.get("versionInfo", ""),
+                    get_package_license(package),
+                ]
+            )
     elif "txt" == format:
-        deps = ""
-        for dep in dependencies.json()["sbom"]["packages"]:
-            deps += dep["name"] + "\n"
-        return deps
+        for package in sbom["sbom"]["packages"]:
+            output.write(package["name"] + "\n")
     else:
+        logging.error(f"Invalid export format {format}. Must be one of `csv` or `txt`.")
+        return False
+    return True
+
+
+def get_dependencies(
+    repository: str,
+    organization: str,
+    token: str,
+    format: str = "sbom",
+    output: Any = None,
+) -> Any:
+    """
+    Get the list of dependencies for one repository.
+
+    Available formats:
+    - `sbom` - SPDX json
+    - `CSV` - CSV export
+    - `txt` - basic export
+
+    `csv` and `txt` rows are written to `output` if given, and returned as a string otherwise.
+
+    https://docs.github.com/en/rest/dependency-graph/sboms?apiVersion=2022-11-28
+    """
+    if format not in ["sbom", "csv", "txt"]:
         logging.error(f"Invalid export format {format}. Must be one of `sbom`, `csv` or `txt`.")
-    return False
+        return False
+
+    sbom = get_sbom(repository, organization, token)
+    if not sbom:
+        return False
+
+    if "sbom" == format:
+        return sbom
+
+    if output is not None:
+        return write_dependencies(sbom, repository, output, format)
+
+    buffer = io.StringIO()
+    write_dependencies(sbom, repository, buffer, format)
+    return buffer.getvalue()
@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+#!/usr/bin/env python3
+"""Inverted index of the dependencies of the organization.
+
+Maps each (ecosystem, package) to the repositories using it, with the version and license,
+so "who uses package X" is answered without fetching any SBOM.
+"""
+
+import re
+from typing import Any, Dict, Iterator, List, Tuple
+
+from .cache import load_json_file, save_json_file
+from .dependabot import get_package_license
+
+INDEX_FORMAT = 1
+
+VERSION_OPERATORS = ["<=", ">=", "==", "!=", "<", ">", "="]
+
+
+def parse_package(package: Dict) -> Tuple[str, str]:
+    """(ecosystem, name) of an SBOM package, from its purl or else its `ecosystem:name` name"""
+    for reference in package.get("externalRefs") or []:
+        locator = reference.get("referenceLocator", "")
+        if reference.get("referenceType") == "purl" and locator.startswith("pkg:"):
+            ecosystem, _, name = locator[4:].partition("/")
+            name = name.split("@")[0].split("?")[0].split("#")[0]
+            return ecosystem.lower(), name.replace("%40", "@")
+
+    ecosystem, _, name = package["name"].partition(":")
+    if not name:
+        return "", ecosystem
+    return ecosystem.lower(), name
+
+
+def version_key(version: str) -> Tuple:
+    """Comparable key of a version: numbers compare numerically, and pre-releases sort first"""
+    parts = [
+        (1, int(part), "") if part.isdigit() else (0, 0, part)
+        for part in re.findall(r"\d+|[a-zA-Z]+", version or "")
+    ]
+    release = 0
+    while release < len(parts) and parts[release][0] == 1:
+        release += 1
+    # 2.0 == 2.0.0, and 2.0-beta == 2.0.0-beta
+    end = release
+    while end and parts[end - 1] == (1, 0, ""):
+        end -= 1
+    parts = parts[:end] + parts[release:]
+    # Sorts after pre-release tags, and before further numbers: 2.0-beta < 2.0 < 2.0.1
+    parts.append((0.5, 0, ""))
+    return tuple(parts)
+
+
+def match_version(version: str, specifier: str) -> bool:
+    """
+    Whether `version` matches a comma-separated list of constraints, e.g. `>=2.0,<2.15.0`.
+
+    A constraint without operator is an exact match.
+    """
+    if not specifier:
+        return True
+
+    key = version_key(version)
+    for constraint in specifier.split(","):
+        constraint = constraint.strip()
+        if not constraint:
+            continue
+        operator = next(
+            (op for op in VERSION_OPERATORS if constraint.startswith(op)), ""
+        )
+        bound = version_key(constraint[len(operator) :].strip())
+
+        if operator in ["", "==", "="] and key != bound:
+            return False
+        if operator == "!=" and key == bound:
+            return False
+        if operator == "<" and not key < bound:
+            return False
+        if operator == "<=" and not key <= bound:
+            return False
+        if operator == ">" and not key > bound:
+            return False
+        if operator == ">=" and not key >= bound:
+            return False
+    return True
+
+
+class DependencyIndex:
+    """
+    Inverted index from `ecosystem:package` to the repositories using it.
+
+    Stored as compact JSON, with repository names and licenses interned:
+    `packages` maps each `ecosystem:package` to [repository id, version, license id] rows.
+    """
+
+    def __init__(self, location: str = None):
+        self.location = location
+        data = load_json_file(location, None)
+        if not data or data.get("format") != INDEX_FORMAT:
+            data = {
+                "format": INDEX_FORMAT,
+                "repositories": [],
+                "heads": {},
+                "licenses": [],
+                "packages": {},
+            }
+        self.data = data
+
+        self.repository_ids = {
+            name: index for index, name in enumerate(data["repositories"])
+        }
+        self.license_ids = {name: index for index, name in enumerate(data["licenses"])}
+        self._packages_per_repository = None
+
+    def intern(self, values: List, ids: Dict, value: str) -> int:
+        if value not in ids:
+            ids[value] = len(values)
+            values.append(value)
+        return ids[value]
+
+    @property
+    def packages_per_repository(self) -> Dict:
+        """Repository id to the keys of its packages, built on first update"""
+        if self._packages_per_repository is None:
+            self._packages_per_repository = {}
+            for key, rows in self.data["packages"].items():
+                for row in rows:
+                    self._packages_per_repository.setdefault(row[0], set()).add(key)
+        return self._packages_per_repository
+
+    def get_head(self, repository: str) -> Any:
+        """Default branch head the repository was indexed at, if known"""
+        return self.data["heads"].get(repository)
+
+    def remove(self, repository: str) -> None:
+        repository_id = self.repository_ids.get(repository)
+        if repository_id is None:
+            return
+
+        for key in self.packages_per_repository.pop(repository_id, set()):
+            rows = [row for row in self.data["packages"][key] if row[0] != repository_id]
+            if rows:
+                self.data["packages"][key] = rows
+            else:
+                del self.data["packages"][key]
+        self.data["heads"].pop(repository, None)
+
+    def update(self, repository: str, sbom: Dict, head: str = None) -> int:
+        """Replace the packages of a repository with the ones of its SBOM. Returns the number of packages."""
+        self.remove(repository)
+
+        repository_id = self.intern(
+            self.data["repositories"], self.repository_ids, repository
+        )
+        keys = self.packages_per_repository.setdefault(repository_id, set())
+
+        count = 0
+        for package in sbom["sbom"]["packages"]:
+            ecosystem, name = parse_package(package)
+            # The SBOM describes the repository itself as a package
+            if not ecosystem:
+                continue
+
+            key = f"{ecosystem}:{name}"
+            license_id = self.intern(
+                self.data["licenses"], self.license_ids, get_package_license(package)
+            )
+            self.data["packages"].setdefault(key, []).append(
+                [repository_id, package.get("versionInfo", ""), license_id]
+            )
+            keys.add(key)
+            count += 1
+
+        self.data["heads"][repository] = head
+        return count
+
+    def query(self, ecosystem: str, package: str, versions: str = "") -> Iterator:
+        """Yield the (repository, version, license) using a package, optionally within `versions`"""
+        for repository_id, version, license_id in self.data["packages"].get(
+            f"{ecosystem.lower()}:{package}", []
+        ):
+            if match_version(version, versions):
+                yield (
+                    self.data["repositories"][repository_id],
+                    version,
+                    self.data["licenses"][license_id],
+                )
+
+    def save(self) -> bool:
+        if not self.location:
+            return False
+        return save_json_file(self.location, self.data, compact=True)
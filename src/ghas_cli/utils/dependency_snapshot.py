@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+#!/usr/bin/env python3
+"""Per-repository snapshots of the dependencies, to report what changed between two runs."""
+
+import hashlib
+from typing import Dict, Iterator, List
+
+from .cache import load_json_file, save_json_file
+
+SNAPSHOT_FORMAT = 1
+
+
+def get_package_entries(sbom: Dict) -> List:
+    """Sorted, unique `name@version` entries of the packages of an SBOM"""
+    return sorted(
+        {
+            f"{package['name']}@{package.get('versionInfo', '')}"
+            for package in sbom["sbom"]["packages"]
+        }
+    )
+
+
+def get_entries_digest(entries: List) -> str:
+    """Digest of a sorted package set, to skip the diff of unchanged repositories"""
+    return hashlib.sha256("\n".join(entries).encode()).hexdigest()[:16]
+
+
+def diff_entries(old_entries: List, new_entries: List) -> Iterator:
+    """
+    Yield the (change, package, old version, new version) between two package sets.
+
+    `change` is `added`, `removed`, or `updated` when a package is both removed and added with another version.
+    """
+    old_entries = set(old_entries)
+    new_entries = set(new_entries)
+
+    removed = {}
+    for entry in old_entries - new_entries:
+        name, _, version = entry.rpartition("@")
+        removed.setdefault(name, []).append(version)
+    added = {}
+    for entry in new_entries - old_entries:
+        name, _, version = entry.rpartition("@")
+        added.setdefault(name, []).append(version)
+
+    for name in sorted(set(removed) | set(added)):
+        old_versions = sorted(removed.get(name, []))
+        new_versions = sorted(added.get(name, []))
+        while old_versions and new_versions:
+            yield "updated", name, old_versions.pop(0), new_versions.pop(0)
+        for version in old_versions:
+            yield "removed", name, version, ""
+        for version in new_versions:
+            yield "added", name, "", version
+
+
+class DependencySnapshot:
+    """Package sets of the repositories at the previous run, persisted as compact JSON"""
+
+    def __init__(self, location: str):
+        self.location = location
+        data = load_json_file(location, None)
+        if not data or data.get("format") != SNAPSHOT_FORMAT:
+            data = {"format": SNAPSHOT_FORMAT, "repositories": {}}
+        self.data = data
+
+    def update(self, repository: str, sbom: Dict) -> Iterator:
+        """Record the new package set of a repository, and yield its changes, see `diff_entries`"""
+        entries = get_package_entries(sbom)
+        digest = get_entries_digest(entries)
+
+        previous = self.data["repositories"].get(repository)
+        self.data["repositories"][repository] = {"digest": digest, "packages": entries}
+
+        if previous is not None and previous["digest"] == digest:
+            return iter(())
+        return diff_entries(previous["packages"] if previous else [], entries)
+
+    def save(self) -> bool:
+        return save_json_file(self.location, self.data, compact=True)
@@ -1,9 +1,11 @@
 # -*- coding: utf-8 -*-
 #!/usr/bin/env python3
 
+import csv
 import json
 import logging
-from typing import Dict
+import os
+from typing import Any, Dict, List
 
 
 def output_to_csv(alerts_per_repos: Dict, location: str) -> bool:
@@ -15,3 +17,76 @@ def output_to_csv(alerts_per_repos: Dict, location: str) -> bool:
         logging.error(f"Failure to write the output to {location}")
         return False
     return True
+
+
+def is_empty_output(stream: Any) -> bool:
+    """Whether an output file has no content yet, e.g. to write a CSV header only once when appending"""
+    name = getattr(stream, "name", "-")
+    if not isinstance(name, str) or name in ["-", "<stdout>"]:
+        return True
+    return not os.path.exists(name) or os.path.getsize(name) == 0
+
+
+class StreamWriter:
+    """
+    Write records one at a time, as NDJSON or CSV, so nothing is held in memory.
+
+    The stream is flushed every `flush_every` records, so consumers can read it while it's written.
+    """
+
+    def __init__(
+        self,
+        stream: Any,
+        format: str = "ndjson",
+        fields: List = None,
+        flush_every: int = 100,
+        header: bool = True,
+    ):
+        """
+        Args:
+            stream: A text file-like object.
+            format: `ndjson` or `csv`.
+            fields: Columns to write, in order. Required for `csv`.
+            flush_every: Number of records between two flushes.
+            header: Whether to write the CSV header.
+        """
+        if format not in ["ndjson", "csv"]:
+            raise ValueError(f"Invalid export format {format}. Must be `ndjson` or `csv`.")
+        if "csv" == format and not fields:
+            raise ValueError("CSV export requires a list of fields.")
+
+        self.stream = stream
+        self.format = format
+        self.fields = fields
+        self.flush_every = flush_every
+        self.count = 0
+
+        self.csv_writer = None
+        if "csv" == format:
+            self.csv_writer = csv.DictWriter(
+                stream, fieldnames=fields, extrasaction="ignore", lineterminator="\n"
+            )
+            if header:
+                self.csv_writer.writeheader()
+
+    def write(self, record: Dict) -> None:
+        if self.csv_writer:
+            self.csv_writer.writerow(
+                {
+                    field: json.dumps(value)
+                    if isinstance(value, (dict, list))
+                    else value
+                    for field, value in record.items()
+                }
+            )
+        else:
+            if self.fields:
+                record = {field: record.get(field) for field in self.fields}
+            self.stream.write(json.dumps(record) + "\n")
+
+        self.count += 1
+        if self.count % self.flush_every == 0:
+            self.flush()
+
+    def flush(self) -> None:
+        self.stream.flush()
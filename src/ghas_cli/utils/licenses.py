@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+#!/usr/bin/env python3
+"""Rollup of the licenses of the dependencies across repositories."""
+
+import re
+from collections import Counter
+from typing import Dict, List
+
+from .dependabot import get_package_license
+from .dependency_index import parse_package
+
+# SPDX identifier prefixes of copyleft licenses, weak copyleft included
+COPYLEFT_LICENSES = [
+    "AGPL-",
+    "GPL-",
+    "LGPL-",
+    "MPL-",
+    "EPL-",
+    "EUPL-",
+    "CDDL-",
+    "OSL-",
+    "CC-BY-SA-",
+    "SSPL-",
+]
+
+# Operators of SPDX license expressions
+LICENSE_OPERATORS = ["AND", "OR", "WITH"]
+
+
+def get_license_identifiers(expression: str) -> List:
+    """SPDX identifiers of a license expression, e.g. `MIT OR GPL-2.0-only` gives both"""
+    return [
+        token
+        for token in re.findall(r"[A-Za-z0-9.+:-]+", expression)
+        if token not in LICENSE_OPERATORS
+    ]
+
+
+def is_copyleft(expression: str) -> bool:
+    """Whether a license expression mentions a copyleft license"""
+    return any(
+        identifier.startswith(prefix)
+        for identifier in get_license_identifiers(expression)
+        for prefix in COPYLEFT_LICENSES
+    )
+
+
+class LicenseRollup:
+    """
+    Package counts per license, per repository and per ecosystem, fed one SBOM at a time.
+
+    Only counters are kept, so memory grows with the number of distinct licenses and not of packages.
+    """
+
+    def __init__(self):
+        self.licenses = Counter()
+        self.repositories: Dict[str, Counter] = {}
+        self.ecosystems: Dict[str, Counter] = {}
+        self.copyleft: Dict[str, Counter] = {}
+        self.packages = 0
+
+    def add(self, repository: str, sbom: Dict) -> None:
+        repository_licenses = self.repositories.setdefault(repository, Counter())
+        for package in sbom["sbom"]["packages"]:
+            ecosystem, _ = parse_package(package)
+            # The SBOM describes the repository itself as a package
+            if not ecosystem:
+                continue
+
+            license = get_package_license(package)
+            self.licenses[license] += 1
+            repository_licenses[license] += 1
+            self.ecosystems.setdefault(ecosystem, Counter())[license] += 1
+            if is_copyleft(license):
+                self.copyleft.setdefault(repository, Counter())[license] += 1
+            self.packages += 1
+
+    def report(self) -> Dict:
+        return {
+            "packages": self.packages,
+            "repositories_count": len(self.repositories),
+            "licenses": dict(self.licenses.most_common()),
+            "ecosystems": {
+                ecosystem: dict(counts.most_common())
+                for ecosystem, counts in sorted(self.ecosystems.items())
+            },
+            "repositories": {
+                repository: dict(counts.most_common())
+                for repository, counts in sorted(self.repositories.items())
+            },
+            "copyleft_repositories": {
+                repository: dict(counts.most_common())
+                for repository, counts in sorted(self.copyleft.items())
+            },
+        }
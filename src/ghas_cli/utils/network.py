@@ -2,9 +2,11 @@
 #!/usr/bin/env python3
 
 import logging
+import threading
 import time
 from datetime import datetime
-from typing import Any, Dict
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
 
 import requests
 
@@ -17,6 +19,30 @@ SLEEP_BETWEEN_REQUESTS = 2
 # Number of times to try a network request before failing
 RETRIES = 5
 
+# The search API has its own, lower, rate limit
+# https://docs.github.com/en/rest/search/search#rate-limit
+SEARCH_REQUESTS_PER_MINUTE = 30
+
+
+class RateBucket:
+    """Space out the requests sharing a rate limit, across threads"""
+
+    def __init__(self, requests_per_minute: int):
+        self.interval = 60 / requests_per_minute
+        self.next_request = 0.0
+        self.lock = threading.Lock()
+
+    def wait(self) -> None:
+        with self.lock:
+            now = time.monotonic()
+            delay = self.next_request - now
+            self.next_request = max(now, self.next_request) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+search_bucket = RateBucket(SEARCH_REQUESTS_PER_MINUTE)
+
 
 def get_github_headers(token: str) -> Dict:
     return {
@@ -50,6 +76,35 @@ def check_rate_limit(response: Any) -> bool:
     return False
 
 
+def get_next_cursor(response: Any) -> Optional[str]:
+    """Return the `after` cursor of the next page from the Link header, if any"""
+    next_link = response.links.get("next")
+    if not next_link:
+        return None
+
+    cursor = parse_qs(urlparse(next_link["url"]).query).get("after")
+    if not cursor:
+        return None
+    return cursor[0]
+
+
+def get_next_page(response: Any, url: str, params: Dict) -> Optional[Tuple[str, Dict]]:
+    """
+    Return the (url, params) of the next page, or None on the last page.
+
+    Cursor-based pages keep `url` and `params` with the next `after` cursor.
+    Otherwise the next link is followed as is, so a page-numbered link doesn't end the listing.
+    """
+    next_link = response.links.get("next")
+    if not next_link:
+        return None
+
+    cursor = get_next_cursor(response)
+    if cursor:
+        return url, {**params, "after": cursor}
+    return next_link["url"], None
+
+
 def check_unauthorized(response: Any):
     if response.status_code == 401:
         logging.error(response.json()["message"])
@@ -68,6 +123,13 @@ def get(*args, **kwargs):
     return response
 
 
+def search(*args, **kwargs):
+    search_bucket.wait()
+    response = requests.get(*args, **kwargs)
+    check_response(response)
+    return response
+
+
 def post(*args, **kwargs):
     response = requests.post(*args, **kwargs)
     check_response(response)
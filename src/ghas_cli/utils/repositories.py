@@ -3,19 +3,28 @@
 
 import base64
 import datetime
+import hashlib
+import json
 import logging
 import secrets
 import time
-from typing import Any, List
+from functools import lru_cache
+from typing import Any, Dict, Iterator, List, Tuple
 
 from . import network
-from .template_loader import load_template
+from .template_loader import compile_template, load_base64_template, load_template
 from .validation import validate_organization_name, validate_repository_name
 
+# Files deployed by ghas-cli
+CODEQL_WORKFLOW = ".github/workflows/codeql-analysis-default.yml"
+CODEQL_CONFIG = ".github/codeql/codeql-config-default.yml"
+DEPENDENCY_REVIEW_WORKFLOW = ".github/workflows/dependency_enforcement.yml"
+
 
 class Repository:
     def __init__(
         self,
+        id=0,
         name="",
         orga="Malwarebytes",
         owner="",
@@ -25,9 +34,11 @@ class Repository:
         languages=[],
         default_branch="main",
         license="",
+        topics=None,
         archived=False,
         disabled=False,
         updated_at="",
+        pushed_at="",
         ghas=False,
         secret_scanner=False,
         secret_push_prot=False,
@@ -35,6 +46,7 @@ class Repository:
         dependabot_alerts=False,
         codeql=False,
     ):
+        self.id: int = id
         self.name: str = name
         self.orga: str = orga
         self.owner: str = owner
@@ -44,9 +56,11 @@ class Repository:
         self.languages: List = languages
         self.default_branch: str = default_branch
         self.license: str = license  # spdx_id
+        self.topics: List = topics  # None if unknown
         self.archived: bool = archived
         self.disabled: bool = disabled
         self.updated_at: str = updated_at
+        self.pushed_at: str = pushed_at
         self.ghas: bool = ghas
         self.secret_scanner: bool = secret_scanner
         self.secret_push_prot: bool = secret_push_prot
@@ -57,6 +71,7 @@ class Repository:
     def load_json(self, obj, token=None):
         """Load and parse a repository from an API json object"""
 
+        self.id = obj["id"]
         self.name = obj["name"]
         if obj["owner"]["type"] == "Organization":
             self.orga = obj["owner"]["login"]
@@ -66,32 +81,49 @@ class Repository:
         self.url = obj["html_url"]
         self.description = obj["description"]
         self.main_language = obj["language"]
-        self.languages = get_languages(self.orga, token, self.name)
+        if token:
+            self.languages = get_languages(self.orga, token, self.name)
+        else:
+            self.languages = []
         self.default_branch = obj["default_branch"]
         try:
             self.license = obj["license"]["spdx_id"]
         except Exception:
             self.license = None
+        self.topics = obj.get("topics", [])
         self.archived = obj["archived"]
         self.disabled = obj["disabled"]
         self.updated_at = obj["updated_at"]
+        self.pushed_at = obj.get("pushed_at")
         try:
-            self.ghas = obj["security_and_analysis"]["advanced_security"]["status"]
+            self.ghas = (
+                obj["security_and_analysis"]["advanced_security"]["status"]
+                == "enabled"
+            )
         except Exception:
             self.ghas = False
         try:
-            self.secret_scanner = obj["security_and_analysis"]["advanced_security"][
-                "secret_scanning"
-            ]["status"]
+            self.secret_scanner = (
+                obj["security_and_analysis"]["secret_scanning"]["status"] == "enabled"
+            )
         except Exception:
             self.secret_scanner = False
         try:
-            self.secret_push_prot = obj["security_and_analysis"]["advanced_security"][
-                "secret_scanning_push_protection"
-            ]["status"]
+            self.secret_push_prot = (
+                obj["security_and_analysis"]["secret_scanning_push_protection"][
+                    "status"
+                ]
+                == "enabled"
+            )
         except Exception:
             self.secret_push_prot = False
-        self.dependabot = False
+        try:
+            self.dependabot = (
+                obj["security_and_analysis"]["dependabot_security_updates"]["status"]
+                == "enabled"
+            )
+        except Exception:
+            self.dependabot = False
         if token:
             self.dependabot_alerts = check_dependabot_alerts_enabled(
                 token, self.orga, self.name
@@ -100,6 +132,13 @@ class Repository:
             self.dependabot_alerts = False
         self.codeql = False
 
+    def load_inventory_json(self, obj):
+        """Load a repository from an inventory object, as exported by `to_json`"""
+
+        for key, value in obj.items():
+            if hasattr(self, key):
+                setattr(self, key, value)
+
     def __str__(self):
         return f"""[{self.name}]
         * Organization: {self.orga}
@@ -123,6 +162,7 @@ class Repository:
 
     def to_json(self):
         return {
+            "id": self.id,
             "name": self.name,
             "orga": self.orga,
             "owner": self.owner,
@@ -132,9 +172,11 @@ class Repository:
             "languages": self.languages,
             "default_branch": self.default_branch,
             "license": self.license,
+            "topics": self.topics,
             "archived": self.archived,
             "disabled": self.disabled,
             "updated_at": self.updated_at,
+            "pushed_at": self.pushed_at,
             "ghas": self.ghas,
             "secret_scanner": self.secret_scanner,
             "secret_push_prot": self.secret_push_prot,
@@ -147,20 +189,11 @@ class Repository:
         return {"repo": f"{self.orga}/{self.name}"}
 
 
-def get_org_repositories(
-    status: str,
-    organization: str,
-    token: str,
-    language: str = "",
-    default_branch: str = "",
-    license: str = "",
-    archived: bool = False,
-    disabled: bool = False,
-) -> List:
+def iter_org_repositories(status: str, organization: str, token: str) -> Iterator:
+    """Iterate over the raw API objects of the organization repositories, without enrichment"""
     page = 1
 
     headers = network.get_github_headers(token)
-    repos_list = []
     while True:
         params = {
             "type": f"{status}",
@@ -180,42 +213,331 @@ def get_org_repositories(
         if [] == repos.json():
             break
 
-        for r in repos.json():
-            repo = Repository()
-            repo.load_json(r, token=token)
-            # repo.load_json(r, token=None)
+        yield from repos.json()
+
+        page += 1
+
+
+def filter_repository(
+    repo: Repository,
+    language: str = "",
+    default_branch: str = "",
+    license: str = "",
+    archived: bool = False,
+    disabled: bool = False,
+    topic: str = "",
+    pushed_after: str = "",
+) -> bool:
+    """Return whether a repository matches all the filters"""
+    if language != "" and repo.main_language != language:
+        logging.info(
+            f"{repo.name} ignored because of language: {language} vs. {repo.main_language}"
+        )
+        return False
+    if default_branch != "" and repo.default_branch != default_branch:
+        logging.info(
+            f"{repo.name} ignored because of default branch: {default_branch} vs. {repo.default_branch}"
+        )
+        return False
+    if license != "" and repo.license != license:
+        logging.info(
+            f"{repo.name} ignored because of license: {license} vs. {repo.license}"
+        )
+        return False
+    if repo.archived != archived:
+        logging.info(
+            f"{repo.name} ignored because of archived: {archived} vs. {repo.archived}"
+        )
+        return False
+    if repo.disabled != disabled:
+        logging.info(
+            f"{repo.name} ignored because of disabled: {disabled} vs. {repo.disabled}"
+        )
+        return False
+    if topic != "" and topic not in (repo.topics or []):
+        logging.info(f"{repo.name} ignored because of topic: {topic} vs. {repo.topics}")
+        return False
+    if pushed_after != "" and (repo.pushed_at or "")[:10] < pushed_after:
+        logging.info(
+            f"{repo.name} ignored because of pushed date: {pushed_after} vs. {repo.pushed_at}"
+        )
+        return False
+
+    return True
+
+
+def get_org_repositories(
+    status: str,
+    organization: str,
+    token: str,
+    language: str = "",
+    default_branch: str = "",
+    license: str = "",
+    archived: bool = False,
+    disabled: bool = False,
+    topic: str = "",
+    pushed_after: str = "",
+    backend: str = "listing",
+) -> List:
+    """
+    List the organization repositories matching the filters.
+
+    Backends:
+    - `listing` - walk every repository of the organization and filter client-side
+    - `search` - filter server-side with the search API, see `search_org_repositories`
+    """
+    if "search" == backend:
+        raw_repos = search_org_repositories(
+            status, organization, token, language, license, archived, topic, pushed_after
+        )
+    else:
+        raw_repos = iter_org_repositories(status, organization, token)
+
+    repos_list = []
+    for r in raw_repos:
+        repo = Repository()
+        repo.load_json(r, token=token)
+        # repo.load_json(r, token=None)
+
+        if not filter_repository(
+            repo,
+            language,
+            default_branch,
+            license,
+            archived,
+            disabled,
+            topic,
+            pushed_after,
+        ):
+            continue
+
+        repos_list.append(repo)
+
+    return repos_list
+
+
+###### Search
+
+# The search API returns at most 1000 results per query
+SEARCH_MAX_RESULTS = 1000
+
+# Oldest creation date of a GitHub repository
+SEARCH_START_DATE = datetime.datetime(2007, 10, 1)
+
+SEARCH_DATE_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+
+def build_search_query(
+    organization: str,
+    status: str = "all",
+    language: str = "",
+    license: str = "",
+    archived: bool = False,
+    topic: str = "",
+    pushed_after: str = "",
+    created: Tuple = None,
+) -> str:
+    """Translate the repository filters into a search query"""
+    qualifiers = [f"org:{organization}"]
+
+    if status in ["public", "private", "internal"]:
+        qualifiers.append(f"is:{status}")
+    if "forks" == status:
+        qualifiers.append("fork:only")
+    elif "sources" == status:
+        qualifiers.append("fork:false")
+    else:
+        qualifiers.append("fork:true")
+
+    if language != "":
+        qualifiers.append(f'language:"{language}"')
+    if license != "":
+        qualifiers.append(f"license:{license.lower()}")
+    qualifiers.append(f"archived:{str(archived).lower()}")
+    if topic != "":
+        qualifiers.append(f"topic:{topic}")
+    if pushed_after != "":
+        qualifiers.append(f"pushed:>={pushed_after}")
+    if created:
+        qualifiers.append(
+            f"created:{created[0].strftime(SEARCH_DATE_FORMAT)}..{created[1].strftime(SEARCH_DATE_FORMAT)}"
+        )
+
+    return " ".join(qualifiers)
+
+
+def split_search_range(created: Tuple) -> List:
+    """Split a creation date range in two halves, to the second"""
+    start, end = created
+    middle = start + datetime.timedelta(seconds=int((end - start).total_seconds()) // 2)
+    return [
+        (start, middle),
+        (middle + datetime.timedelta(seconds=1), end),
+    ]
 
-            if language != "" and repo.main_language != language:
-                logging.info(
-                    f"{repo.name} ignored because of language: {language} vs. {repo.main_language}"
+
+class SearchUnavailable(Exception):
+    """Raised when a page of search results can't be retrieved"""
+
+    pass
+
+
+def search_org_repositories(
+    status: str,
+    organization: str,
+    token: str,
+    language: str = "",
+    license: str = "",
+    archived: bool = False,
+    topic: str = "",
+    pushed_after: str = "",
+) -> Iterator:
+    """
+    Iterate over the raw API objects of the organization repositories matching the filters, using the search API.
+
+    Queries over `SEARCH_MAX_RESULTS` results are split into creation date shards, so nothing is truncated.
+    Only a single second with more results than that can't be split, and is logged as an error.
+
+    Raises:
+        SearchUnavailable: If a page still fails after `network.RETRIES` attempts.
+    """
+    headers = network.get_github_headers(token)
+
+    now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None, microsecond=0)
+    shards = [(SEARCH_START_DATE, now)]
+    while shards:
+        created = shards.pop(0)
+        query = build_search_query(
+            organization,
+            status,
+            language,
+            license,
+            archived,
+            topic,
+            pushed_after,
+            created,
+        )
+
+        page = 1
+        while True:
+            params = {"q": query, "sort": "updated", "per_page": 100, "page": page}
+            i = 0
+            while i < network.RETRIES:
+                # Rate limits are waited for by `network.search`, the same page is then retried
+                repos = network.search(
+                    url="https://api.github.com/search/repositories",
+                    params=params,
+                    headers=headers,
                 )
-                continue
-            if default_branch != "" and repo.default_branch != default_branch:
-                logging.info(
-                    f"{repo.name} ignored because of default branch: {default_branch} vs. {repo.default_branch}"
+                if repos.status_code == 200 or repos.status_code == 422:
+                    break
+                i += 1
+
+            if repos.status_code != 200:
+                logging.error(
+                    f"Search failed for {query}: {repos.status_code} - {repos.content}"
                 )
-                continue
-            if license != "" and repo.license != license:
-                logging.info(
-                    f"{repo.name} ignored because of license: {license} vs. {repo.license}"
+                raise SearchUnavailable(query)
+
+            results = repos.json()
+            if 1 == page and results["total_count"] > SEARCH_MAX_RESULTS:
+                if created[0] < created[1]:
+                    logging.info(
+                        f"{results['total_count']} results for {query}, splitting the date range."
+                    )
+                    shards = split_search_range(created) + shards
+                    break
+                logging.error(
+                    f"{results['total_count']} repositories created at {created[0]}, only the first {SEARCH_MAX_RESULTS} are listed."
                 )
-                continue
-            if repo.archived != archived:
-                logging.info(
-                    f"{repo.name} ignored because of archived: {archived} vs. {repo.archived}"
+
+            yield from results["items"]
+
+            if page * 100 >= min(results["total_count"], SEARCH_MAX_RESULTS):
+                break
+            page += 1
+
+
+def get_repository(
+    organization: str, token: str, repository: str, languages: bool = False
+) -> Any:
+    """
+    Load a repository metadata and security state once, to share it across steps.
+
+    The languages are only fetched with `languages`, for the steps deploying CodeQL.
+    """
+    headers = network.get_github_headers(token)
+
+    repo_resp = network.get(
+        url=f"https://api.github.com/repos/{organization}/{repository}",
+        headers=headers,
+    )
+    if repo_resp.status_code != 200:
+        return False
+
+    repo = Repository()
+    repo.load_json(repo_resp.json())
+    if languages:
+        repo.languages = get_languages(organization, token, repository)
+    # Checked by `get_deployed_features`, only when needed
+    repo.dependabot_alerts = None
+    return repo
+
+
+def get_deployed_features(
+    organization: str, token: str, repo: Repository, features: List
+) -> List:
+    """
+    Return which of the requested features are already deployed on a repository.
+
+    Features: `secret_scanner`, `push_protection`, `dependabot`, `codeql` and `reviewer`.
+    The security state comes from `repo`, only the workflow files are checked remotely,
+    and the Dependabot alerts if unknown.
+    """
+    headers = network.get_github_headers(token)
+
+    deployed = []
+    for feature in features:
+        if "secret_scanner" == feature:
+            is_deployed = repo.secret_scanner
+        elif "push_protection" == feature:
+            is_deployed = repo.secret_push_prot
+        elif "dependabot" == feature:
+            if repo.dependabot_alerts is None:
+                repo.dependabot_alerts = check_dependabot_alerts_enabled(
+                    token, organization, repo.name
                 )
-                continue
-            if repo.disabled != disabled:
-                logging.info(
-                    f"{repo.name} ignored because of license: {archived} vs. {repo.archived}"
+            is_deployed = repo.dependabot_alerts
+        elif "codeql" == feature:
+            is_deployed = (
+                get_file_sha(organization, repo.name, headers, CODEQL_WORKFLOW)
+                is not None
+            )
+        elif "reviewer" == feature:
+            is_deployed = (
+                get_file_sha(
+                    organization, repo.name, headers, DEPENDENCY_REVIEW_WORKFLOW
                 )
-                continue
+                is not None
+            )
+        else:
+            is_deployed = False
 
-            repos_list.append(repo)
+        if is_deployed:
+            deployed.append(feature)
 
-        page += 1
+    return deployed
 
-    return repos_list
+
+def load_inventory(inventory: Any) -> Dict:
+    """Load a `repositories list --format json` export, indexed by repository name"""
+    repos = {}
+    for obj in json.load(inventory):
+        repo = Repository()
+        repo.load_inventory_json(obj)
+        repos[repo.name] = repo
+
+    return repos
 
 
 def get_default_branch_last_updated(
@@ -260,6 +582,88 @@ def get_topics(token: str, organization: str, repository_name: str) -> List:
     return topics_res["names"]
 
 
+def get_topics_bulk(
+    token: str, organization: str, repositories_names: List, inventory: Dict = {}
+) -> Dict:
+    """
+    Return the topics of several repositories, indexed by repository name.
+
+    Topics are taken from the inventory, then from a single organization listing.
+    Only the repositories missing from both are queried one by one.
+    """
+    topics = {}
+    for name in repositories_names:
+        if name in inventory and inventory[name].topics is not None:
+            topics[name] = inventory[name].topics
+
+    missing = set(repositories_names) - set(topics)
+    if missing:
+        for r in iter_org_repositories("all", organization, token):
+            if r["name"] in missing:
+                topics[r["name"]] = r.get("topics", [])
+                missing.discard(r["name"])
+                if not missing:
+                    break
+
+    for name in missing:
+        logging.info(f"{name} not found in the organization listing")
+        topics[name] = get_topics(token, organization, name)
+
+    return topics
+
+
+# Number of repositories resolved per GraphQL query
+GRAPHQL_BATCH_SIZE = 50
+
+
+def build_heads_query(organization: str, repositories_names: List) -> str:
+    """GraphQL query of the default branch head of several repositories, aliased `r0`, `r1`..."""
+    fields = [
+        f"r{index}: repository(owner: {json.dumps(organization)}, name: {json.dumps(name)}) "
+        "{ defaultBranchRef { target { oid } } }"
+        for index, name in enumerate(repositories_names)
+    ]
+    return "query { " + " ".join(fields) + " }"
+
+
+def get_default_branch_heads(
+    organization: str, token: str, repositories_names: List
+) -> Dict:
+    """
+    Return the head commit SHA of the default branch of several repositories, indexed by name.
+
+    Repositories are resolved `GRAPHQL_BATCH_SIZE` at a time.
+    Empty, missing or unresolved repositories map to None.
+    """
+    headers = network.get_github_headers(token)
+
+    heads = {}
+    for start in range(0, len(repositories_names), GRAPHQL_BATCH_SIZE):
+        batch = repositories_names[start : start + GRAPHQL_BATCH_SIZE]
+        response = network.post(
+            url="https://api.github.com/graphql",
+            headers=headers,
+            json={"query": build_heads_query(organization, batch)},
+        )
+
+        data = {}
+        if response.status_code == 200:
+            # Missing repositories are reported in `errors`, next to the others' data
+            data = response.json().get("data") or {}
+        else:
+            logging.error(
+                f"Unable to resolve the default branches - {response.status_code} - {response.content}"
+            )
+
+        for index, name in enumerate(batch):
+            try:
+                heads[name] = data[f"r{index}"]["defaultBranchRef"]["target"]["oid"]
+            except (KeyError, TypeError):
+                heads[name] = None
+
+    return heads
+
+
 def archive(
     organization: str, token: str, repository: str, archive: bool = True
 ) -> bool:
@@ -285,7 +689,7 @@ def check_dependabot_alerts_enabled(
     headers = network.get_github_headers(token)
 
     status = network.get(
-        url=f"https://api.github.com/orgs/{organization}/repos/vulnerability-alerts",
+        url=f"https://api.github.com/repos/{organization}/{repository_name}/vulnerability-alerts",
         headers=headers,
     )
 
@@ -389,6 +793,28 @@ def get_default_branch(organization: str, token: str, repository: str) -> str:
         return False
 
 
+CODEQL_LANGUAGES = ["cpp", "csharp", "go", "java", "javascript", "python", "ruby", "swift"]
+CODEQL_ALIASED_LANGUAGES = {
+    "typescript": "javascript",
+    "kotlin": "java",
+    "c#": "csharp",
+    "c++": "cpp",
+}
+
+
+def filter_codeql_languages(languages: List) -> List:
+    """Map a list of repository languages to the languages supported by CodeQL"""
+
+    codeql_languages = ["actions"] #https://github.blog/changelog/2024-12-17-find-and-fix-actions-workflows-vulnerabilities-with-codeql-public-preview/
+    for language in [l.lower() for l in languages]:
+        if language in CODEQL_ALIASED_LANGUAGES:
+            language = CODEQL_ALIASED_LANGUAGES[language]
+        if language in CODEQL_LANGUAGES and language not in codeql_languages:
+            codeql_languages.append(language)
+
+    return codeql_languages
+
+
 def get_languages(
     organization: str,
     token: str,
@@ -397,14 +823,6 @@ def get_languages(
 ) -> List:
     """Get the main language for a repository"""
 
-    codeql_languages = ["cpp", "csharp", "go", "java", "javascript", "python", "ruby", "swift"]
-    codeql_aliased_languages = {
-        "typescript": "javascript",
-        "kotlin": "java",
-        "c#": "csharp",
-        "c++": "cpp",
-    }
-
     headers = network.get_github_headers(token)
     languages_resp = network.get(
         url=f"https://api.github.com/repos/{organization}/{repository}/languages",
@@ -417,58 +835,129 @@ def get_languages(
         )
         return ["default"]
 
+    if only_codeql:
+        return filter_codeql_languages(languages_resp.json())
+
     languages = ["actions"] #https://github.blog/changelog/2024-12-17-find-and-fix-actions-workflows-vulnerabilities-with-codeql-public-preview/
     for language in [l.lower() for l in languages_resp.json()]:
-        if only_codeql:
-            if language in codeql_languages:
-                languages.append(language)
-            elif language in codeql_aliased_languages:
-                languages.append(codeql_aliased_languages[language])
-        else:
-            languages.append(language)
+        languages.append(language)
 
     return languages
 
 
-def load_codeql_base64_template(languages: List, branches: List = ["main"]) -> str:
-    minute = secrets.randbelow(60)
-    hour = secrets.randbelow(24)
-    day = secrets.randbelow(7)
-    data = load_template("codeql-analysis-default.yml")
-    data = data.replace(
-        """branches: [ ]""",
-        f"""branches: [{', '.join(f"'{branch}'" for branch in branches)   }]""",
+CODEQL_WORKFLOW_PLACEHOLDERS = (
+    ("branches", """branches: [ ]"""),
+    ("languages", """language: [ ]"""),
+    ("cron", """cron: '36 4 * * 3'"""),
+)
+
+
+def get_codeql_cron(seed: str = None) -> str:
+    """
+    Weekly CodeQL schedule, spread over the week to avoid running all the repositories at once.
+
+    A seed (e.g `organization/repository`) always yields the same schedule, a random one otherwise.
+    """
+    if seed is None:
+        minute = secrets.randbelow(60)
+        hour = secrets.randbelow(24)
+        day = secrets.randbelow(7)
+    else:
+        digest = int.from_bytes(hashlib.sha256(seed.encode("utf-8")).digest()[:8], "big")
+        minute = digest % 60
+        hour = (digest // 60) % 24
+        day = (digest // (60 * 24)) % 7
+    return f"{minute} {hour} * * {day}"
+
+
+# Stands for the schedule in the cached templates, which are shared by all the repositories
+CODEQL_CRON_MARKER = "\0cron\0"
+
+
+@lru_cache(maxsize=1024)
+def split_codeql_template(languages: Tuple, branches: Tuple) -> Tuple[str, str]:
+    """The CodeQL workflow rendered for `languages` and `branches`, split around the schedule line"""
+    template = compile_template(
+        "codeql-analysis-default.yml", CODEQL_WORKFLOW_PLACEHOLDERS
+    )
+    rendered = template.render(
+        branches=f"""branches: [{', '.join(f"'{branch}'" for branch in branches)   }]""",
+        languages=f"""language: {list(languages)}""",
+        cron=CODEQL_CRON_MARKER,
+    )
+    prefix, suffix = rendered.split(CODEQL_CRON_MARKER)
+    return prefix, suffix
+
+
+def render_codeql_template(languages: Tuple, branches: Tuple, cron: str) -> str:
+    prefix, suffix = split_codeql_template(languages, branches)
+    return f"{prefix}cron: '{cron}'{suffix}"
+
+
+def load_codeql_template(
+    languages: List, branches: List = ["main"], seed: str = None
+) -> str:
+    return render_codeql_template(
+        tuple(languages), tuple(branches), get_codeql_cron(seed)
     )
-    data = data.replace("""language: [ ]""", f"""language: {languages}""")
-    data = data.replace(
-        """cron: '36 4 * * 3'""", f"""cron: '{minute} {hour} * * {day}'"""
+
+
+@lru_cache(maxsize=1024)
+def encode_codeql_template_parts(languages: Tuple, branches: Tuple) -> Tuple:
+    """
+    Base64 encode the CodeQL workflow once for `languages` and `branches`, leaving the schedule out.
+
+    Base64 encodes 3 bytes at a time, so the prefix is encoded up to a multiple of 3 bytes,
+    and its last bytes are kept raw. The suffix is encoded once for each of the 3 possible
+    alignments of the schedule line, keeping the bytes that complete the schedule block raw.
+    Returns (encoded prefix, raw prefix end, {alignment: (raw suffix start, encoded suffix end)}).
+    """
+    prefix, suffix = split_codeql_template(languages, branches)
+    prefix = prefix.encode("utf-8")
+    suffix = suffix.encode("utf-8")
+
+    aligned = len(prefix) - len(prefix) % 3
+    suffixes = {}
+    for alignment in range(3):
+        head = (3 - alignment) % 3
+        suffixes[alignment] = (suffix[:head], base64.b64encode(suffix[head:]))
+    return base64.b64encode(prefix[:aligned]), prefix[aligned:], suffixes
+
+
+def load_codeql_base64_template(
+    languages: List, branches: List = ["main"], seed: str = None
+) -> str:
+    encoded_prefix, prefix_end, suffixes = encode_codeql_template_parts(
+        tuple(languages), tuple(branches)
     )
-    return base64.b64encode(data.encode("utf-8")).decode("utf-8")
+    middle = prefix_end + f"cron: '{get_codeql_cron(seed)}'".encode("utf-8")
+    suffix_start, encoded_suffix = suffixes[len(middle) % 3]
+    # A multiple of 3 bytes, so it encodes without padding between the cached parts
+    middle += suffix_start
+    return (encoded_prefix + base64.b64encode(middle) + encoded_suffix).decode("utf-8")
 
 
 def load_codeql_config_base64_template() -> str:
-    template = load_template("codeql-config-default.yml")
-    return base64.b64encode(template.encode(encoding="utf-8")).decode("utf-8")
+    return load_base64_template("codeql-config-default.yml")
 
 
-def create_branch(
-    headers, organization: str, repository: str, default_branch: str, target_branch: str
-):
-    branch_resp = network.get(
-        url=f"https://api.github.com/repos/{organization}/{repository}/git/refs/heads",
+def get_branch_sha(headers, organization: str, repository: str, branch: str) -> Any:
+    """Get the head commit SHA of a single branch"""
+    ref_resp = network.get(
+        url=f"https://api.github.com/repos/{organization}/{repository}/git/ref/heads/{branch}",
         headers=headers,
     )
-
-    if branch_resp.status_code != 200:
+    if ref_resp.status_code != 200:
         return False
 
-    refs = branch_resp.json()
-    sha1 = ""
-    for ref in refs:
-        if ref["ref"] == f"refs/heads/{default_branch}":
-            sha1 = ref["object"]["sha"]
+    return ref_resp.json()["object"]["sha"]
 
-    if sha1 == "":
+
+def create_branch(
+    headers, organization: str, repository: str, default_branch: str, target_branch: str
+):
+    sha1 = get_branch_sha(headers, organization, repository, default_branch)
+    if not sha1:
         return False
 
     payload = {
@@ -492,24 +981,51 @@ def create_branch(
     return False
 
 
+def open_pull_request(headers, organization: str, repository: str, payload) -> bool:
+    """Open a PR, retrying if rate-limited"""
+    i = 0
+    while i < network.RETRIES:
+        pr_resp = network.post(
+            url=f"https://api.github.com/repos/{organization}/{repository}/pulls",
+            headers=headers,
+            json=payload,
+        )
+        if pr_resp.status_code == 201:
+            return True
+
+        if network.check_rate_limit(pr_resp):
+            time.sleep(network.SLEEP_1_MINUTE)
+
+        i += 1
+
+    logging.error(f"Failed to create PR: {pr_resp.json()}")
+    return False
+
+
 def create_codeql_pr(
     organization: str,
     token: str,
     repository: str,
     target_branch: str = "appsec-ghas-codeql_enable",
+    repo: Repository = None,
 ) -> bool:
     """
     1. Retrieve the repository languages. Select the `codeql-analysis.yml` file for that language.
     2. Create a branch
     3. Push a .github/workflows/codeql-analysis.yml to the repository on that branch
     3. Create an associated PR
+
+    If `repo` is given, its default branch and languages are reused instead of being fetched.
     """
     validate_organization_name(organization)
     validate_repository_name(repository)
     headers = network.get_github_headers(token)
 
     # Get the default branch
-    default_branch = get_default_branch(organization, token, repository)
+    if repo:
+        default_branch = repo.default_branch
+    else:
+        default_branch = get_default_branch(organization, token, repository)
     if not default_branch:
         return False
 
@@ -524,10 +1040,15 @@ def create_codeql_pr(
 
     # Create commit
 
-    languages = get_languages(organization, token, repository, only_codeql=True)
+    if repo:
+        languages = filter_codeql_languages(repo.languages)
+    else:
+        languages = get_languages(organization, token, repository, only_codeql=True)
 
     # Workflow config
-    template = load_codeql_base64_template(languages, [default_branch])
+    template = load_codeql_base64_template(
+        languages, [default_branch], seed=f"{organization}/{repository}"
+    )
     workflow_commit_payload = {
         "message": "Create CodeQL analysis workflow",
         "content": template,
@@ -606,35 +1127,14 @@ def create_codeql_pr(
             f"This PR creates the Security scanning (CodeQL) configuration files for your repository languages ({', '.join(languages)}).\n\n We also just opened an informative issue in this repository to give you the context and assistance you need. In most cases you will be able to merge this PR as is and start benefiting from security scanning right away, as a check in each PR, and in the [Security tab](https://github.com/{organization}/{repository}/security/code-scanning) of this repository. \nHowever, we encourage you to review the configuration files and tag @{organization}/security-appsec (or `#github-appsec-security` on Slack) if you have any questions.\n\nWe are here to help! :thumbsup:\n\n - Application Security team."
         )
 
-    # Retry if rate-limited
-    i = 0
-    while i < network.RETRIES:
-        pr_resp = network.post(
-            url=f"https://api.github.com/repos/{organization}/{repository}/pulls",
-            headers=headers,
-            json=pr_payload,
-        )
-        if pr_resp.status_code == 201:
-            return True
-
-        if network.check_rate_limit(pr_resp):
-            time.sleep(network.SLEEP_1_MINUTE)
-
-        i += 1
-
-    if pr_resp.status_code != 201:
-        logging.error(f"Failed to create PR: {pr_resp.json()}")
-        return False
-
-    return True
+    return open_pull_request(headers, organization, repository, pr_payload)
 
 
 ###### Dependency Review
 
 
 def load_dependency_review_base64_template() -> str:
-    template = load_template("dependency_enforcement.yml")
-    return str(base64.b64encode(template.encode(encoding="utf-8")), "utf-8")
+    return load_base64_template("dependency_enforcement.yml")
 
 
 def create_dependency_enforcement_pr(
@@ -642,18 +1142,24 @@ def create_dependency_enforcement_pr(
     token: str,
     repository: str,
     target_branch: str = "appsec-ghas-dep-enforcement-enable",
+    repo: Repository = None,
 ) -> bool:
     """
     2. Create a branch
     3. Push a .github/workflows/dependency_enforcement.yml to the repository on that branch
     3. Create an associated PR
+
+    If `repo` is given, its default branch is reused instead of being fetched.
     """
     validate_organization_name(organization)
     validate_repository_name(repository)
     headers = network.get_github_headers(token)
 
     # Get the default branch
-    default_branch = get_default_branch(organization, token, repository)
+    if repo:
+        default_branch = repo.default_branch
+    else:
+        default_branch = get_default_branch(organization, token, repository)
     if not default_branch:
         return False
 
@@ -690,27 +1196,7 @@ def create_dependency_enforcement_pr(
         "base": default_branch,
     }
 
-    # Retry if rate-limited
-    i = 0
-    while i < network.RETRIES:
-        pr_resp = network.post(
-            url=f"https://api.github.com/repos/{organization}/{repository}/pulls",
-            headers=headers,
-            json=payload,
-        )
-
-        if pr_resp.status_code == 201:
-            return True
-
-        if network.check_rate_limit(pr_resp):
-            time.sleep(network.SLEEP_1_MINUTE)
-
-        i += 1
-
-    if pr_resp.status_code != 201:
-        return False
-
-    return True
+    return open_pull_request(headers, organization, repository, payload)
 
 
 def get_file_sha(organization, repository, headers, file):
@@ -721,3 +1207,172 @@ def get_file_sha(organization, repository, headers, file):
     if file_resp.status_code == 200:
         return file_resp.json()["sha"]
     return None
+
+
+###### Onboarding
+
+def commit_files(
+    headers,
+    organization: str,
+    repository: str,
+    base_sha: str,
+    target_branch: str,
+    files: Dict,
+    message: str,
+) -> bool:
+    """
+    Write several files in a single commit on a new branch, using the Git data API.
+
+    `files` maps each path to its plain text content.
+    """
+    commit_resp = network.get(
+        url=f"https://api.github.com/repos/{organization}/{repository}/git/commits/{base_sha}",
+        headers=headers,
+    )
+    if commit_resp.status_code != 200:
+        return False
+
+    tree_payload = {
+        "base_tree": commit_resp.json()["tree"]["sha"],
+        "tree": [
+            {"path": path, "mode": "100644", "type": "blob", "content": content}
+            for path, content in files.items()
+        ],
+    }
+    tree_resp = network.post(
+        url=f"https://api.github.com/repos/{organization}/{repository}/git/trees",
+        headers=headers,
+        json=tree_payload,
+    )
+    if tree_resp.status_code != 201:
+        logging.error(f"Tree creation response: {tree_resp.status_code}")
+        return False
+
+    commit_payload = {
+        "message": message,
+        "tree": tree_resp.json()["sha"],
+        "parents": [base_sha],
+    }
+    commit_resp = network.post(
+        url=f"https://api.github.com/repos/{organization}/{repository}/git/commits",
+        headers=headers,
+        json=commit_payload,
+    )
+    if commit_resp.status_code != 201:
+        logging.error(f"Commit creation response: {commit_resp.status_code}")
+        return False
+
+    ref_payload = {
+        "ref": f"refs/heads/{target_branch}",
+        "sha": commit_resp.json()["sha"],
+    }
+    ref_resp = network.post(
+        url=f"https://api.github.com/repos/{organization}/{repository}/git/refs",
+        headers=headers,
+        json=ref_payload,
+    )
+    if ref_resp.status_code == 422:
+        logging.error("Branch already exists")
+        return False
+
+    return ref_resp.status_code == 201
+
+
+def render_onboarding_pr_body(
+    organization: str, repository: str, languages: List, codeql: bool, reviewer: bool
+) -> str:
+    """Render the onboarding PR body from the enabled components"""
+    components = []
+    if codeql:
+        components.append(
+            f"* **Security code scanning (CodeQL)**: `{CODEQL_WORKFLOW}` and `{CODEQL_CONFIG}`, tuned for your repository languages ({', '.join(languages)}). Results show up as a check in each PR, and in the [Security tab](https://github.com/{organization}/{repository}/security/code-scanning) of this repository. We also just opened an informative issue in this repository to give you the context and assistance you need."
+        )
+    if reviewer:
+        components.append(
+            f"* **Dependency Reviewer**: `{DEPENDENCY_REVIEW_WORKFLOW}`, to prevent vulnerable dependencies from reaching your codebase, as a check in each PR."
+        )
+
+    return (
+        "This PR enables the following security features in your repository:\n\n"
+        + "\n".join(components)
+        + f"\n\nIn most cases you will be able to merge this PR as is and start benefiting from them right away. \nHowever, we encourage you to review the configuration files and tag @{organization}/security-appsec (or `#github-appsec-security` on Slack) if you have any questions.\n\nWe are here to help! :thumbsup:\n\n - Application Security team."
+    )
+
+
+def create_onboarding_pr(
+    organization: str,
+    token: str,
+    repository: str,
+    codeql: bool = True,
+    reviewer: bool = True,
+    target_branch: str = "appsec-ghas-onboarding",
+    repo: Repository = None,
+) -> bool:
+    """
+    Bundle the CodeQL and Dependency Reviewer workflows in a single PR.
+
+    1. Retrieve the default branch head, and the repository languages if CodeQL is enabled
+    2. Commit all the enabled workflow and config files at once on a new branch
+    3. Create an associated PR
+
+    If `repo` is given, its default branch and languages are reused instead of being fetched.
+    """
+    validate_organization_name(organization)
+    validate_repository_name(repository)
+    headers = network.get_github_headers(token)
+
+    if not codeql and not reviewer:
+        return False
+
+    # Get the default branch
+    if repo:
+        default_branch = repo.default_branch
+    else:
+        default_branch = get_default_branch(organization, token, repository)
+    if not default_branch:
+        return False
+
+    base_sha = get_branch_sha(headers, organization, repository, default_branch)
+    if not base_sha:
+        return False
+
+    files = {}
+    languages = []
+    if codeql:
+        if repo:
+            languages = filter_codeql_languages(repo.languages)
+        else:
+            languages = get_languages(
+                organization, token, repository, only_codeql=True
+            )
+        files[CODEQL_WORKFLOW] = load_codeql_template(
+            languages, [default_branch], seed=f"{organization}/{repository}"
+        )
+        files[CODEQL_CONFIG] = load_template("codeql-config-default.yml")
+    if reviewer:
+        files[DEPENDENCY_REVIEW_WORKFLOW] = load_template(
+            "dependency_enforcement.yml"
+        )
+
+    if not commit_files(
+        headers,
+        organization,
+        repository,
+        base_sha,
+        target_branch,
+        files,
+        "Enable security scanning workflows",
+    ):
+        logging.error(f"Couldn't create branch {target_branch}")
+        return False
+
+    pr_payload = {
+        "title": "Security onboarding - configuration files",
+        "body": render_onboarding_pr_body(
+            organization, repository, languages, codeql, reviewer
+        ),
+        "head": target_branch,
+        "base": default_branch,
+    }
+
+    return open_pull_request(headers, organization, repository, pr_payload)
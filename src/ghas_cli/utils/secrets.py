@@ -1,11 +1,232 @@
 # -*- coding: utf-8 -*-
 #!/usr/bin/env python3
 
-from typing import List
+import itertools
+import logging
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Iterator, List
 
 import requests
 
 from . import network
+from .cache import JsonCache, load_json_file, save_json_file
+
+
+class SecretScanningUnavailable(Exception):
+    """Raised when a page of secret scanning alerts can't be retrieved"""
+
+    pass
+
+
+def iter_secret_alert_pages(
+    state: str,
+    token: str,
+    organization: str,
+    cursor: str = None,
+    secret_types: List = [],
+    sort: str = "",
+) -> Iterator:
+    """
+    Iterate over the pages of secret scanning alerts of the organization, following the `after` cursors.
+
+    Yields (alerts, next cursor), starting after `cursor` if given.
+    `secret_types` are filtered by the API. With `sort` (`created` or `updated`), the most recent come first.
+
+    Raises:
+        SecretScanningUnavailable: If a page can't be retrieved, rate limit retries included,
+            or if the next page isn't cursor-based.
+    """
+
+    headers = network.get_github_headers(token)
+
+    params = {"per_page": 100}
+    if state:
+        params["state"] = state
+    if secret_types:
+        params["secret_type"] = ",".join(secret_types)
+    if sort:
+        params["sort"] = sort
+        params["direction"] = "desc"
+    # An empty cursor opts into cursor pagination from the first page
+    params["after"] = cursor or ""
+
+    while True:
+        i = 0
+        while i < network.RETRIES:
+            secrets = requests.get(
+                url=f"https://api.github.com/orgs/{organization}/secret-scanning/alerts",
+                params=params,
+                headers=headers,
+            )
+            if network.check_rate_limit(secrets):
+                i += 1
+            else:
+                break
+
+        if secrets.status_code != 200:
+            logging.error(
+                f"Unable to retrieve the secret scanning alerts for {organization} - {secrets.status_code} - {secrets.content}"
+            )
+            raise SecretScanningUnavailable(organization)
+
+        cursor = network.get_next_cursor(secrets)
+        if not cursor and "next" in secrets.links:
+            # Checkpoints need a cursor to resume from, a page-numbered link can't be one
+            logging.error(
+                f"No cursor in the next link of the secret scanning alerts for {organization} - {secrets.links['next']['url']}"
+            )
+            raise SecretScanningUnavailable(organization)
+        yield secrets.json(), cursor
+
+        if not cursor:
+            break
+        params["after"] = cursor
+
+
+def iter_secret_alerts(
+    state: str,
+    token: str,
+    organization: str,
+    cursor: str = None,
+    on_page: Callable = None,
+    secret_types: List = [],
+) -> Iterator:
+    """
+    Iterate over the raw secret scanning alerts of the organization, see `iter_secret_alert_pages`.
+
+    Once all the alerts of a page are consumed, `on_page(next_cursor)` is called,
+    so the caller can checkpoint its progress.
+    """
+
+    for alerts, next_cursor in iter_secret_alert_pages(
+        state, token, organization, cursor, secret_types
+    ):
+        yield from alerts
+        if on_page is not None:
+            on_page(next_cursor)
+
+
+def get_shard_key(state: str, secret_type: str) -> str:
+    return f"{state}:{secret_type or 'all'}"
+
+
+def iter_secret_alerts_sharded(
+    states: List,
+    token: str,
+    organization: str,
+    secret_types: List = [],
+    workers: int = 4,
+    cursors: Dict = {},
+    on_page: Callable = None,
+) -> Iterator:
+    """
+    Iterate over the secret scanning alerts of the organization, one shard per state and secret type.
+
+    Shards are fetched concurrently, `workers` at a time, and merged into one stream
+    without duplicates. Shards start after their cursor in `cursors`, keyed by `get_shard_key`,
+    and are skipped if their cursor is `done`.
+    Once all the alerts of a page are consumed, `on_page(shard key, next cursor)` is called,
+    with `done` as the cursor of the last page.
+
+    Raises:
+        SecretScanningUnavailable: If a page can't be retrieved, once the other shards are stopped.
+    """
+
+    shards = []
+    for state in states:
+        for secret_type in secret_types or [None]:
+            key = get_shard_key(state, secret_type)
+            if cursors.get(key) != "done" and key not in [shard[0] for shard in shards]:
+                shards.append((key, state, secret_type))
+
+    # Bounded, so fetching stays at most a few pages ahead of the consumer
+    pages = queue.Queue(maxsize=2 * max(workers, 1))
+    stop = threading.Event()
+
+    def fetch_shard(key: str, state: str, secret_type: str) -> None:
+        # Every shard ends with a (key, None, None) sentinel, stopped or failed included
+        try:
+            if stop.is_set():
+                return
+            for alerts, next_cursor in iter_secret_alert_pages(
+                state,
+                token,
+                organization,
+                cursors.get(key),
+                [secret_type] if secret_type else [],
+            ):
+                if stop.is_set():
+                    return
+                pages.put((key, alerts, next_cursor or "done"))
+        except Exception as e:
+            pages.put((key, e, None))
+        finally:
+            pages.put((key, None, None))
+
+    seen = set()
+    error = None
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        for shard in shards:
+            executor.submit(fetch_shard, *shard)
+
+        remaining = len(shards)
+        try:
+            while remaining:
+                key, alerts, next_cursor = pages.get()
+                if alerts is None:
+                    remaining -= 1
+                    continue
+                if isinstance(alerts, Exception):
+                    error = error or alerts
+                    stop.set()
+                    continue
+                if stop.is_set():
+                    continue
+
+                for alert in alerts:
+                    if alert["url"] in seen:
+                        continue
+                    seen.add(alert["url"])
+                    yield alert
+                if on_page is not None:
+                    on_page(key, next_cursor)
+        finally:
+            # Unblock the shards waiting on a full queue until they all end, if the consumer stopped early
+            stop.set()
+            while remaining:
+                if pages.get()[1] is None:
+                    remaining -= 1
+
+    if error is not None:
+        raise error
+
+
+# Exported fields, in order
+SECRET_FIELDS = [
+    "state",
+    "resolution",
+    "resolved_at",
+    "repository_full_name",
+    "url",
+    "secret_type",
+    "secret",
+]
+
+
+def summarize_secret(secret: Dict) -> Dict:
+    """Keep the fields of a secret scanning alert we export"""
+    s = {}
+    s["state"] = secret["state"]
+    s["resolution"] = secret["resolution"]
+    s["resolved_at"] = secret["resolved_at"]
+    s["repository_full_name"] = secret["repository"]["full_name"]
+    s["url"] = secret["url"]
+    s["secret_type"] = secret["secret_type"]
+    s["secret"] = secret["secret"]
+    return s
 
 
 def export_secrets(
@@ -13,39 +234,187 @@ def export_secrets(
 ) -> List:
     """Get all secrets from the organization"""
 
-    headers = network.get_github_headers(token)
+    secret_types = [] if secrets_filter == "all" else [secrets_filter]
 
     secret_list = []
+    for secret in iter_secret_alerts(
+        state, token, organization, secret_types=secret_types
+    ):
+        secret_list.append(summarize_secret(secret))
+
+    return secret_list
+
+
+def summarize_location(location: Dict) -> str:
+    """One line description of a secret location, e.g. `path:line@commit` for commits"""
+    details = location.get("details") or {}
+    if location.get("type") == "commit":
+        return f"{details.get('path')}:{details.get('start_line')}@{details.get('commit_sha')}"
+
+    urls = [value for key, value in details.items() if key.endswith("_url")]
+    return f"{location.get('type')}:{urls[0] if urls else ''}"
+
+
+def get_secret_locations(alert: Dict, token: str) -> Any:
+    """Get the locations of one secret scanning alert, or None on failure"""
+
+    headers = network.get_github_headers(token)
+
+    locations = []
     page = 1
     while True:
-        params = {"state": state, "per_page": 100, "page": page}
+        i = 0
+        while i < network.RETRIES:
+            response = requests.get(
+                url=alert["locations_url"],
+                params={"per_page": 100, "page": page},
+                headers=headers,
+            )
+            if network.check_rate_limit(response):
+                i += 1
+            else:
+                break
 
-        secrets = requests.get(
-            url=f"https://api.github.com/orgs/{organization}/secret-scanning/alerts",
-            params=params,
-            headers=headers,
-        )
+        if response.status_code != 200:
+            logging.error(
+                f"Unable to retrieve the locations of {alert['url']} - {response.status_code} - {response.content}"
+            )
+            return None
 
-        if network.check_rate_limit(secrets):
-            break
-        if secrets.status_code != 200:
+        if not response.json():
             break
+        locations.extend(summarize_location(location) for location in response.json())
 
-        if not secrets.json():
+        if "next" not in response.links:
             break
+        page += 1
 
-        for secret in secrets.json():
-            s = {}
-            s["state"] = secret["state"]
-            s["resolution"] = secret["resolution"]
-            s["resolved_at"] = secret["resolved_at"]
-            s["repository_full_name"] = secret["repository"]["full_name"]
-            s["url"] = secret["url"]
-            s["secret_type"] = secret["secret_type"]
-            s["secret"] = secret["secret"]
+    return locations
 
-            if secrets_filter == "all" or s["secret_type"] == secrets_filter:
-                secret_list.append(s)
 
-        page += 1
-    return secret_list
+def iter_secret_locations(
+    alerts: Iterable,
+    token: str,
+    workers: int = 4,
+    locations_cache: JsonCache = None,
+) -> Iterator:
+    """
+    Fetch the locations of a stream of alerts, `workers` at a time.
+
+    Yields (alert, locations or None) in input order. At most twice `workers` alerts are pending.
+    Locations of resolved alerts can't change anymore, so they are kept in `locations_cache`.
+    """
+
+    def fetch(alert: Dict) -> Any:
+        resolved = alert["state"] == "resolved" and locations_cache is not None
+        if resolved:
+            locations = locations_cache.get(alert["url"])
+            if locations is not None:
+                return locations
+
+        locations = get_secret_locations(alert, token)
+        if resolved and locations is not None:
+            locations_cache.set(alert["url"], locations)
+        return locations
+
+    workers = max(workers, 1)
+    alerts = iter(alerts)
+    pending = deque()
+    error = None
+
+    def pull(executor: ThreadPoolExecutor, count: int) -> None:
+        # The alerts already pulled are still yielded if the source fails
+        nonlocal error
+        if error is not None:
+            return
+        try:
+            for alert in itertools.islice(alerts, count):
+                pending.append((alert, executor.submit(fetch, alert)))
+        except Exception as e:
+            error = e
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pull(executor, 2 * workers)
+
+        while pending:
+            alert, future = pending.popleft()
+            locations = future.result()
+
+            # Pulling the next alert may call back the alerts source, e.g. to checkpoint
+            pull(executor, 1)
+
+            yield alert, locations
+
+    if error is not None:
+        raise error
+
+
+def apply_secret_change(store: Dict, alert: Dict) -> str:
+    """
+    Apply an updated secret scanning alert to the local store, keyed by alert URL.
+
+    Returns the kind of change: `new`, `changed` if its state or resolution changed, or `updated`.
+    """
+    record = {
+        "state": alert["state"],
+        "resolution": alert["resolution"],
+        "updated_at": alert["updated_at"],
+    }
+
+    previous = store.get(alert["url"])
+    store[alert["url"]] = record
+
+    if previous is None:
+        return "new"
+    if (previous["state"], previous["resolution"]) != (
+        record["state"],
+        record["resolution"],
+    ):
+        return "changed"
+    return "updated"
+
+
+def sync_secret_alerts(
+    organization: str, token: str, store_location: str, on_change: Callable
+) -> Any:
+    """
+    Update a local store of the organization secret scanning alerts.
+
+    Alerts are read from the most recently updated, down to the watermark of the previous sync,
+    so the cost depends on the number of changes and not on the total number of alerts.
+    `on_change(alert)` is called for each new alert, and each alert whose state or resolution changed.
+    Returns the number of alerts per kind of change, or False on failure.
+    """
+
+    store = load_json_file(store_location, {"watermark": None, "alerts": {}})
+    watermark = store["watermark"]
+    new_watermark = watermark
+
+    changes = {}
+    try:
+        for alerts, _ in iter_secret_alert_pages(
+            "", token, organization, sort="updated"
+        ):
+            done = False
+            for a in alerts:
+                # Alerts updated at the watermark are re-applied, which is idempotent
+                if watermark and a["updated_at"] < watermark:
+                    done = True
+                    break
+                if new_watermark is None or a["updated_at"] > new_watermark:
+                    new_watermark = a["updated_at"]
+
+                change = apply_secret_change(store["alerts"], a)
+                changes[change] = changes.get(change, 0) + 1
+                if change != "updated":
+                    on_change(a)
+            if done:
+                break
+    except SecretScanningUnavailable:
+        return False
+
+    store["watermark"] = new_watermark
+    if not save_json_file(store_location, store):
+        return False
+
+    return changes
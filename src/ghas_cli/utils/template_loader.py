@@ -2,7 +2,10 @@
 #!/usr/bin/env python3
 """Template loading utilities using importlib.resources for Python 3.8+ compatibility."""
 
+import base64
 import sys
+from functools import lru_cache
+from typing import Dict, List, Tuple
 
 if sys.version_info >= (3, 9):
     from importlib.resources import files
@@ -12,9 +15,12 @@ else:
 from ghas_cli import templates
 
 
+@lru_cache(maxsize=None)
 def load_template(template_name: str) -> str:
     """Load a template file by name.
 
+    Templates are read once and kept in memory for the lifetime of the process.
+
     Args:
         template_name: The filename of the template (e.g., 'codeql.md')
 
@@ -25,3 +31,75 @@ def load_template(template_name: str) -> str:
         return files(templates).joinpath(template_name).read_text(encoding="utf-8")
     else:
         return read_text(templates, template_name)
+
+
+@lru_cache(maxsize=None)
+def load_base64_template(template_name: str) -> str:
+    """Load a template file by name, base64 encoded for the contents API.
+
+    Args:
+        template_name: The filename of the template (e.g., 'dependency_enforcement.yml')
+
+    Returns:
+        The base64 encoded content of the template file.
+    """
+    return base64.b64encode(load_template(template_name).encode("utf-8")).decode(
+        "utf-8"
+    )
+
+
+class CompiledTemplate:
+    """A template split once at its substitution points."""
+
+    def __init__(self, content: str, placeholders: Dict[str, str]):
+        """Split `content` at every occurrence of the placeholders.
+
+        Args:
+            content: The raw template content.
+            placeholders: Maps each field name to the literal text it replaces.
+        """
+        self.parts: List[str] = []
+        self.fields: List[str] = []
+
+        position = 0
+        while True:
+            matches = []
+            for field, marker in placeholders.items():
+                index = content.find(marker, position)
+                if index != -1:
+                    matches.append((index, field, marker))
+            if not matches:
+                break
+            index, field, marker = min(matches)
+            self.parts.append(content[position:index])
+            self.fields.append(field)
+            position = index + len(marker)
+        self.parts.append(content[position:])
+
+    def render(self, **values: str) -> str:
+        """Render the template with one value per field.
+
+        Raises:
+            KeyError: If a field has no value.
+        """
+        rendered = [self.parts[0]]
+        for field, part in zip(self.fields, self.parts[1:]):
+            rendered.append(values[field])
+            rendered.append(part)
+        return "".join(rendered)
+
+
+@lru_cache(maxsize=None)
+def compile_template(
+    template_name: str, placeholders: Tuple[Tuple[str, str], ...]
+) -> CompiledTemplate:
+    """Load and compile a template once per set of substitution points.
+
+    Args:
+        template_name: The filename of the template.
+        placeholders: (field name, literal text to replace) pairs.
+
+    Returns:
+        The compiled template.
+    """
+    return CompiledTemplate(load_template(template_name), dict(placeholders))
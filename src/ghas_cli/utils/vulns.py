@@ -1,55 +1,309 @@
 # -*- coding: utf-8 -*-
 #!/usr/bin/env python3
 
-from typing import Dict, List
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, Iterator, List
 
 import requests
 
 from . import network
+from .cache import JsonCache, load_json_file, save_json_file
 
 
-def get_codeql_alerts_repo(
-    repos: List, organization: str, status: str, token: str
-) -> Dict:
-    """Get CodeQL alerts for one or several repositories"""
+def summarize_alert(alert: Dict) -> Dict:
+    """Keep the fields of a CodeQL alert we report on"""
+    alert_summary = {}
+    alert_summary["number"] = alert["number"]
+    alert_summary["created_at"] = alert["created_at"]
+    alert_summary["state"] = alert["state"]
+    alert_summary["severity"] = alert["rule"]["severity"]
+    return alert_summary
+
+
+def is_code_scanning_missing(response: Any) -> bool:
+    """Whether a code scanning response means code scanning isn't set up on the repository"""
+    if response.status_code == 404:
+        return True
+    if response.status_code == 403:
+        try:
+            message = response.json()["message"]
+        except Exception:
+            return False
+        return "rate limit" not in message.lower()
+    return False
+
+
+def get_codeql_alerts_one_repo(
+    repository: str, organization: str, status: str, token: str, severity: str = ""
+) -> Any:
+    """
+    Get CodeQL alerts for one repository.
+
+    Returns None if code scanning isn't set up on the repository.
+    """
 
     headers = network.get_github_headers(token)
 
-    repositories_alerts = {}
+    alerts_repo = []
+    page = 1
+    while True:
+        params = {"per_page": 100, "page": page}
+        if status:
+            params["state"] = status
+        if severity:
+            params["severity"] = severity
+
+        i = 0
+        while i < network.RETRIES:
+            alerts = requests.get(
+                url=f"https://api.github.com/repos/{organization}/{repository}/code-scanning/alerts",
+                params=params,
+                headers=headers,
+            )
+            if is_code_scanning_missing(alerts):
+                return None
+            if network.check_rate_limit(alerts):
+                i += 1
+            else:
+                break
+
+        if alerts.status_code != 200:
+            break
+
+        if not alerts.json():
+            break
+
+        for a in alerts.json():
+            if not a:
+                continue
 
+            alerts_repo.append(summarize_alert(a))
+
+        page += 1
+
+    return alerts_repo
+
+
+def iter_codeql_alerts_repo(
+    repos: List,
+    organization: str,
+    status: str,
+    token: str,
+    severity: str = "",
+    workers: int = 1,
+    negative_cache: JsonCache = None,
+) -> Iterator:
+    """
+    Iterate over the CodeQL alerts of one or several repositories, fetching `workers` repositories at once.
+
+    Yields (repository name, alert summary) as soon as each repository is done.
+    Repositories without code scanning are recorded in the negative cache, and skipped while cached.
+    """
+
+    to_fetch = []
     for repo in repos:
-        alerts_repo = []
-        page = 1
+        if negative_cache is not None and repo.name in negative_cache:
+            logging.info(f"{repo.name} skipped: no code scanning (cached)")
+        else:
+            to_fetch.append(repo.name)
+
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        futures = {
+            executor.submit(
+                get_codeql_alerts_one_repo,
+                repository,
+                organization,
+                status,
+                token,
+                severity,
+            ): repository
+            for repository in to_fetch
+        }
+        for future in as_completed(futures):
+            repository = futures[future]
+            alerts_repo = future.result()
+            if alerts_repo is None:
+                logging.info(f"{repository}: no code scanning")
+                if negative_cache is not None:
+                    negative_cache.set(repository, True)
+                continue
+
+            for alert_summary in alerts_repo:
+                yield repository, alert_summary
+
+    if negative_cache is not None:
+        negative_cache.save()
+
+
+def get_codeql_alerts_repo(
+    repos: List,
+    organization: str,
+    status: str,
+    token: str,
+    severity: str = "",
+    workers: int = 1,
+    negative_cache: JsonCache = None,
+) -> Dict:
+    """Get CodeQL alerts for one or several repositories, see `iter_codeql_alerts_repo`"""
+
+    repositories_alerts = {repo.name: [] for repo in repos}
+    for repository, alert_summary in iter_codeql_alerts_repo(
+        repos, organization, status, token, severity, workers, negative_cache
+    ):
+        repositories_alerts[repository].append(alert_summary)
+
+    return repositories_alerts
+
 
-        while True:
-            params = {"state": "open", "per_page": 100, "page": page}
+class CodeScanningUnavailable(Exception):
+    """Raised when the organization code scanning alerts can't be listed"""
+
+    pass
+
+
+def iter_codeql_alerts_org(
+    organization: str, status: str, token: str, severity: str = ""
+) -> Iterator:
+    """
+    Iterate over the CodeQL alerts of a whole organization, page by page.
+
+    Yields (repository name, alert summary).
+    Uses the organization endpoint with cursor pagination, so repositories without code scanning cost nothing.
+
+    Raises:
+        CodeScanningUnavailable: If the first page can't be retrieved.
+    """
+
+    headers = network.get_github_headers(token)
+
+    url = f"https://api.github.com/orgs/{organization}/code-scanning/alerts"
+    # An empty cursor asks for cursor-based pagination
+    params = {"tool_name": "CodeQL", "per_page": 100, "after": ""}
+    if status:
+        params["state"] = status
+    if severity:
+        params["severity"] = severity
+
+    first_page = True
+    while True:
+        i = 0
+        while i < network.RETRIES:
             alerts = requests.get(
-                url=f"https://api.github.com/repos/{organization}/{repo.name}/code-scanning/alerts",
+                url=url,
                 params=params,
                 headers=headers,
             )
             if network.check_rate_limit(alerts):
+                i += 1
+            else:
                 break
 
-            if alerts.status_code != 200:
-                break
+        if alerts.status_code != 200:
+            logging.error(
+                f"Unable to retrieve the CodeQL alerts for {organization} - {alerts.status_code} - {alerts.content}"
+            )
+            if first_page:
+                raise CodeScanningUnavailable(organization)
+            break
+        first_page = False
+
+        for a in alerts.json():
+            if not a:
+                continue
+            yield a["repository"]["name"], summarize_alert(a)
+
+        next_page = network.get_next_page(alerts, url, params)
+        if next_page is None:
+            break
+        url, params = next_page
+
+
+def apply_alert_change(store: Dict, alert: Dict) -> str:
+    """
+    Apply an updated CodeQL alert to the local store.
+
+    Returns the kind of change: `new`, the new state (`fixed`, `dismissed`...), or `updated`.
+    """
+    key = f"{alert['repository']['name']}/{alert['number']}"
+    record = summarize_alert(alert)
+    record["updated_at"] = alert["updated_at"]
+
+    previous = store.get(key)
+    store[key] = record
 
-            for a in alerts.json():
-                if not a:
-                    continue
+    if previous is None:
+        return "new"
+    if previous["state"] != record["state"]:
+        return record["state"]
+    return "updated"
 
-                alert_summary = {}
-                alert_summary["number"] = a["number"]
-                alert_summary["created_at"] = a["created_at"]
-                alert_summary["state"] = a["state"]
-                alert_summary["severity"] = a["rule"]["severity"]
-                alerts_repo.append(alert_summary)
 
-            if not alerts.json():
+def sync_codeql_alerts(organization: str, token: str, store_location: str) -> Any:
+    """
+    Update a local store of the organization CodeQL alerts, keyed by repository and alert number.
+
+    Alerts are read from the most recently updated, down to the watermark of the previous sync,
+    so the cost depends on the number of changes and not on the total number of alerts.
+    Returns the number of alerts per kind of change, or False on failure.
+    """
+
+    headers = network.get_github_headers(token)
+
+    store = load_json_file(store_location, {"watermark": None, "alerts": {}})
+    watermark = store["watermark"]
+    new_watermark = watermark
+
+    changes = {}
+    url = f"https://api.github.com/orgs/{organization}/code-scanning/alerts"
+    # An empty cursor asks for cursor-based pagination
+    params = {
+        "tool_name": "CodeQL",
+        "sort": "updated",
+        "direction": "desc",
+        "per_page": 100,
+        "after": "",
+    }
+    done = False
+    while not done:
+        i = 0
+        while i < network.RETRIES:
+            alerts = requests.get(
+                url=url,
+                params=params,
+                headers=headers,
+            )
+            if network.check_rate_limit(alerts):
+                i += 1
+            else:
+                break
+
+        if alerts.status_code != 200:
+            logging.error(
+                f"Unable to sync the CodeQL alerts for {organization} - {alerts.status_code} - {alerts.content}"
+            )
+            return False
+
+        for a in alerts.json():
+            if not a:
+                continue
+            # Alerts updated at the watermark are re-applied, which is idempotent
+            if watermark and a["updated_at"] < watermark:
+                done = True
                 break
+            if new_watermark is None or a["updated_at"] > new_watermark:
+                new_watermark = a["updated_at"]
 
-            page += 1
+            change = apply_alert_change(store["alerts"], a)
+            changes[change] = changes.get(change, 0) + 1
 
-        repositories_alerts[repo.name] = alerts_repo
+        next_page = network.get_next_page(alerts, url, params)
+        if next_page is None:
+            break
+        url, params = next_page
 
-    return repositories_alerts
+    store["watermark"] = new_watermark
+    if not save_json_file(store_location, store):
+        return False
+
+    return changes
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""Tests for the aggregation module."""
+
+import datetime
+
+import pytest
+
+from ghas_cli.utils import aggregation
+from ghas_cli.utils.aggregation import (
+    AlertColumns,
+    get_age_bucket,
+    percentile,
+    summarize,
+)
+
+NOW = datetime.datetime(2024, 12, 31)
+
+
+@pytest.fixture(params=["python", "numpy"])
+def columns(request, monkeypatch):
+    """Alerts loaded with and without NumPy."""
+    if "numpy" == request.param:
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(aggregation, "numpy", None)
+
+    columns = AlertColumns(now=NOW)
+    columns.append("codeql", "repo-a", "error", "2024-12-30T00:00:00Z")
+    columns.append("codeql", "repo-a", "error", "2024-12-01T00:00:00Z")
+    columns.append("dependabot", "repo-a", "high", "2023-01-01T00:00:00Z")
+    columns.append("dependabot", "repo-b", "high", "2024-12-29T00:00:00Z")
+    return columns
+
+
+class TestHelpers:
+    """Tests for the aggregation helpers."""
+
+    def test_age_buckets(self):
+        """Test that ages fall in the right bucket."""
+        assert get_age_bucket(0) == 0
+        assert get_age_bucket(7) == 1
+        assert get_age_bucket(400) == len(aggregation.AGE_BUCKETS) - 1
+
+    def test_percentile_interpolation(self):
+        """Test that percentiles are linearly interpolated."""
+        assert percentile([1, 2, 3, 4], 50) == 2.5
+        assert percentile([10], 90) == 10
+
+
+class TestAlertColumns:
+    """Tests for the AlertColumns class."""
+
+    def test_group_counts(self, columns):
+        """Test the counts per combination of columns."""
+        assert columns.group_counts(["tool", "severity"]) == {
+            ("codeql", "error"): 2,
+            ("dependabot", "high"): 2,
+        }
+        assert columns.group_counts(["repository", "age_bucket"]) == {
+            ("repo-a", "0-7d"): 1,
+            ("repo-a", "30-90d"): 1,
+            ("repo-a", "365d+"): 1,
+            ("repo-b", "0-7d"): 1,
+        }
+
+    def test_age_percentiles(self, columns):
+        """Test the age percentiles per tool."""
+        ages = columns.age_percentiles([50], by="tool")
+        assert ages["codeql"][50] == pytest.approx(15.5)
+        assert ages["dependabot"][50] == pytest.approx((730 + 2) / 2)
+
+    def test_top_repositories(self, columns):
+        """Test that repositories are ranked by number of alerts."""
+        assert columns.top_repositories(1) == [("repo-a", 3)]
+
+    def test_summarize_teams(self, columns):
+        """Test that team rollups add up their repositories."""
+        summary = summarize(columns, teams={"team-x": ["repo-a", "repo-b"]})
+        assert summary["total"] == 4
+        assert sum(row["count"] for row in summary["teams"]["team-x"]) == 4
+        assert sum(row["count"] for row in summary["repositories"]["repo-b"]) == 1
+
+
+class TestEmptyColumns:
+    """Tests for an organization without alerts."""
+
+    def test_summarize_empty(self):
+        """Test that an empty summary is produced."""
+        summary = summarize(AlertColumns(now=NOW), teams={"team-x": ["repo-a"]})
+        assert summary["total"] == 0
+        assert summary["overall"] == []
+        assert summary["age_percentiles"] == {}
+        assert summary["top_repositories"] == []
+        assert summary["teams"] == {}
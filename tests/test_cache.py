@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""Tests for the cache module."""
+
+import os
+import time
+
+import pytest
+
+from ghas_cli.utils.cache import JsonCache, VersionedFileCache
+
+
+class TestJsonCache:
+    """Tests for the JsonCache class."""
+
+    def test_persisted(self, tmp_path):
+        """Test that entries survive a save and reload."""
+        location = str(tmp_path / "cache.json")
+        cache = JsonCache(location)
+        cache.set("test-repo", True)
+        assert cache.save()
+
+        reloaded = JsonCache(location)
+        assert reloaded.get("test-repo") is True
+        assert "test-repo" in reloaded
+        assert "other-repo" not in reloaded
+
+    def test_expired_entries(self, tmp_path):
+        """Test that entries older than the TTL are ignored."""
+        cache = JsonCache(str(tmp_path / "cache.json"), ttl=60)
+        cache.set("test-repo", True)
+        cache.entries["test-repo"][0] = time.time() - 120
+        assert cache.get("test-repo") is None
+
+    def test_unreadable_cache_is_ignored(self, tmp_path):
+        """Test that a corrupted cache file starts an empty cache."""
+        location = tmp_path / "cache.json"
+        location.write_text("{not json")
+        assert JsonCache(str(location)).entries == {}
+
+
+class TestVersionedFileCache:
+    """Tests for the VersionedFileCache class."""
+
+    def test_versions(self, tmp_path):
+        """Test that only the latest version of a key is kept."""
+        cache = VersionedFileCache(str(tmp_path))
+        assert cache.set("repo", "sha1", {"packages": 1})
+        assert cache.get("repo", "sha1") == {"packages": 1}
+
+        assert cache.set("repo", "sha2", {"packages": 2})
+        assert cache.get("repo", "sha1") is None
+        assert cache.get("repo", "sha2") == {"packages": 2}
+
+    def test_similar_keys(self, tmp_path):
+        """Test that a key isn't confused with another key it prefixes."""
+        cache = VersionedFileCache(str(tmp_path))
+        cache.set("repo.js", "sha1", 1)
+        cache.set("repo", "sha2", 2)
+        assert cache.get("repo.js", "sha1") == 1
+
+    def test_eviction(self, tmp_path):
+        """Test that the least recently used entries are evicted first."""
+        cache = VersionedFileCache(str(tmp_path), max_bytes=25)
+        cache.set("old", "sha", "x" * 8)
+        cache.set("used", "sha", "x" * 8)
+        past = time.time() - 60
+        os.utime(cache.path("old", "sha"), (past, past))
+        os.utime(cache.path("used", "sha"), (past + 1, past + 1))
+
+        cache.get("used", "sha")
+        cache.set("new", "sha", "x" * 8)
+
+        assert cache.get("old", "sha") is None
+        assert cache.get("used", "sha") is not None
+        assert cache.get("new", "sha") is not None
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""Tests for the command line interface."""
+
+from click.testing import CliRunner
+
+import cli
+
+
+class TestSecretsExport:
+    """Tests for the secrets export command."""
+
+    def test_prompted_organization(self, tmp_path, monkeypatch):
+        """Test that an export prompted for its organization uses the default filters."""
+        calls = []
+
+        def iter_secret_alerts_sharded(states, token, organization, **kwargs):
+            calls.append((states, organization, kwargs["secret_types"]))
+            return iter([])
+
+        monkeypatch.setattr(
+            cli.secrets, "iter_secret_alerts_sharded", iter_secret_alerts_sharded
+        )
+        output = tmp_path / "secrets.csv"
+
+        result = CliRunner().invoke(
+            cli.cli, ["secrets", "export", str(output)], input="TestOrg\n"
+        )
+
+        assert result.exit_code == 0, result.output
+        assert calls == [(["open"], "TestOrg", [])]
+
+
+class TestMassDeploy:
+    """Tests for the mass deploy command."""
+
+    def test_delta_unavailable_repository(self, tmp_path, monkeypatch):
+        """Test that a repository which can't be loaded isn't redeployed in delta mode."""
+        monkeypatch.setattr(
+            cli.repositories, "get_repository", lambda *args, **kwargs: False
+        )
+
+        def enable_secret_scanner(*args):
+            raise AssertionError("Secret Scanner deployed without its state")
+
+        monkeypatch.setattr(
+            cli.repositories, "enable_secret_scanner", enable_secret_scanner
+        )
+        repos = tmp_path / "repos.txt"
+        repos.write_text("test-repo\n")
+        output = tmp_path / "output.csv"
+
+        result = CliRunner().invoke(
+            cli.cli,
+            ["mass", "deploy", str(repos), str(output), "-o", "TestOrg"]
+            + ["-a", "false", "-s", "true", "-p", "false", "-d", "false"]
+            + ["-c", "false", "-r", "false", "-g", "false", "-e", "true", "-m", "false"],
+        )
+
+        assert result.exit_code == 0, result.output
+        assert output.read_text().startswith("TestOrg,test-repo,None,False,")
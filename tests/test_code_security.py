@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""Tests for the code security configurations module."""
+
+import pytest
+
+from ghas_cli.utils import code_security
+from ghas_cli.utils.code_security import build_configuration
+
+
+class TestBuildConfiguration:
+    """Tests for the build_configuration function."""
+
+    def test_all_features(self):
+        """Test that every requested feature is enabled."""
+        configuration = build_configuration("ghas-cli", True, True, True)
+        assert configuration["name"] == "ghas-cli"
+        assert configuration["advanced_security"] == "enabled"
+        assert configuration["secret_scanning"] == "enabled"
+        assert configuration["secret_scanning_push_protection"] == "enabled"
+        assert configuration["dependabot_alerts"] == "enabled"
+        assert configuration["dependabot_security_updates"] == "enabled"
+
+    def test_disabled_features_are_not_set(self):
+        """Test that features not requested, and settings not managed, are left untouched."""
+        configuration = build_configuration("ghas-cli", False, False, True)
+        assert configuration == {
+            "name": "ghas-cli",
+            "description": "Managed by ghas-cli",
+            "advanced_security": "disabled",
+            "dependency_graph": "enabled",
+            "dependency_graph_autosubmit_action": "not_set",
+            "dependabot_alerts": "enabled",
+            "dependabot_security_updates": "enabled",
+            "code_scanning_default_setup": "not_set",
+            "secret_scanning": "not_set",
+            "secret_scanning_push_protection": "not_set",
+            "secret_scanning_validity_checks": "not_set",
+            "secret_scanning_non_provider_patterns": "not_set",
+            "private_vulnerability_reporting": "not_set",
+            "enforcement": "unenforced",
+        }
+
+    def test_push_protection_requires_secret_scanning(self):
+        """Test that push protection also enables secret scanning."""
+        configuration = build_configuration("ghas-cli", False, True, False)
+        assert configuration["secret_scanning"] == "enabled"
+        assert configuration["secret_scanning_push_protection"] == "enabled"
+
+
+class TestWaitForAttachment:
+    """Tests for the wait_for_attachment function."""
+
+    @pytest.fixture
+    def polls(self, monkeypatch):
+        """Serve successive attachment statuses, without sleeping."""
+        polls = []
+
+        def get_attachment_status(organization, token, configuration_id):
+            return polls.pop(0)
+
+        monkeypatch.setattr(
+            code_security, "get_attachment_status", get_attachment_status
+        )
+        monkeypatch.setattr(code_security.time, "sleep", lambda seconds: None)
+        return polls
+
+    def test_missing_repository(self, polls):
+        """Test that a repository absent from the listing isn't waited for."""
+        polls.append({"repo-a": "attached"})
+        assert code_security.wait_for_attachment(
+            "TestOrg", "token", 1, ["repo-a", "repo-b"]
+        ) == {"repo-a": "attached", "repo-b": "missing"}
+        assert polls == []
+
+    def test_pending_then_attached(self, polls):
+        """Test that pending repositories are polled again, and failed polls retried."""
+        polls.extend([{"repo-a": "attaching"}, None, {"repo-a": "enforced"}])
+        assert code_security.wait_for_attachment("TestOrg", "token", 1, ["repo-a"]) == {
+            "repo-a": "enforced"
+        }
+        assert polls == []
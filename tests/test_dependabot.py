@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""Tests for the dependabot module."""
+
+import io
+import time
+
+import pytest
+
+from ghas_cli.utils.dependabot import (
+    build_alerts_params,
+    iter_sboms,
+    project_alert,
+    write_dependencies,
+)
+
+
+class TestBuildAlertsParams:
+    """Tests for the build_alerts_params function."""
+
+    def test_default(self):
+        """Test that only open alerts are requested by default."""
+        assert build_alerts_params() == {"per_page": 100, "state": "open"}
+
+    def test_filters(self):
+        """Test that list filters are sent comma-separated."""
+        params = build_alerts_params(
+            state="",
+            severity=("critical", "high"),
+            ecosystem=("npm",),
+            package=("lodash", "minimist"),
+            scope="runtime",
+        )
+        assert params == {
+            "per_page": 100,
+            "severity": "critical,high",
+            "ecosystem": "npm",
+            "package": "lodash,minimist",
+            "scope": "runtime",
+        }
+
+
+class TestProjectAlert:
+    """Tests for the project_alert function."""
+
+    ALERT = {
+        "number": 3,
+        "state": "open",
+        "dependency": {
+            "package": {"ecosystem": "npm", "name": "lodash"},
+            "manifest_path": "package-lock.json",
+        },
+        "security_advisory": {"ghsa_id": "GHSA-xxxx", "severity": "high"},
+        "created_at": "2024-01-01T00:00:00Z",
+    }
+
+    def test_nested_fields(self):
+        """Test that nested fields are flattened."""
+        assert project_alert(self.ALERT, ["package", "manifest", "severity"]) == {
+            "package": "lodash",
+            "manifest": "package-lock.json",
+            "severity": "high",
+        }
+
+    def test_missing_fields(self):
+        """Test that missing fields are None."""
+        assert project_alert(self.ALERT, ["cve_id", "repository", "fixed_at"]) == {
+            "cve_id": None,
+            "repository": None,
+            "fixed_at": None,
+        }
+
+
+class TestWriteDependencies:
+    """Tests for the write_dependencies function."""
+
+    SBOM = {
+        "sbom": {
+            "packages": [
+                {
+                    "name": "npm:lodash",
+                    "versionInfo": "4.17.21",
+                    "licenseConcluded": "MIT",
+                },
+                {
+                    "name": "pip:certifi",
+                    "versionInfo": "2024.2.2",
+                    "licenseDeclared": "MPL-2.0, MIT",
+                },
+                {"name": "repo-root"},
+            ]
+        }
+    }
+
+    def test_csv(self):
+        """Test that license expressions with commas are quoted."""
+        output = io.StringIO()
+        assert write_dependencies(self.SBOM, "repo", output, "csv")
+        assert output.getvalue() == (
+            "repo,npm:lodash,4.17.21,MIT\n"
+            'repo,pip:certifi,2024.2.2,"MPL-2.0, MIT"\n'
+            "repo,repo-root,,Unknown\n"
+        )
+
+    def test_txt(self):
+        """Test that only package names are written."""
+        output = io.StringIO()
+        assert write_dependencies(self.SBOM, "repo", output, "txt")
+        assert output.getvalue() == "npm:lodash\npip:certifi\nrepo-root\n"
+
+    def test_invalid_format(self):
+        """Test that an unknown format is rejected."""
+        assert not write_dependencies(self.SBOM, "repo", io.StringIO(), "xml")
+
+
+class TestIterSboms:
+    """Tests for the iter_sboms function."""
+
+    @staticmethod
+    def fetch(repository):
+        """Fetch slower for the first repositories, and fail on `broken`."""
+        if repository == "broken":
+            raise ValueError("SBOM generation failed")
+        time.sleep({"repo-0": 0.1, "repo-1": 0.05}.get(repository, 0))
+        return {"repository": repository}
+
+    def test_input_order(self):
+        """Test that results are yielded in input order."""
+        names = [f"repo-{i}" for i in range(6)]
+        results = list(iter_sboms(names, self.fetch, workers=3))
+        assert [name for name, _ in results] == names
+        assert all(sbom == {"repository": name} for name, sbom in results)
+
+    def test_completion_order(self):
+        """Test that slow repositories don't hold back the others."""
+        names = [f"repo-{i}" for i in range(3)]
+        results = list(iter_sboms(names, self.fetch, workers=3, ordered=False))
+        assert [name for name, _ in results] == ["repo-2", "repo-1", "repo-0"]
+
+    def test_failure(self):
+        """Test that a failing repository yields False."""
+        assert list(iter_sboms(["broken"], self.fetch)) == [("broken", False)]
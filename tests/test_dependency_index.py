@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""Tests for the dependency_index module."""
+
+import pytest
+
+from ghas_cli.utils.dependency_index import (
+    DependencyIndex,
+    match_version,
+    parse_package,
+)
+
+
+def make_sbom(*packages):
+    """SBOM with the repository package and (purl, version, license) packages."""
+    sbom_packages = [{"name": "com.github.TestOrg/repo", "versionInfo": "main"}]
+    for purl, version, license in packages:
+        sbom_packages.append(
+            {
+                "name": purl.split("/")[-1],
+                "versionInfo": version,
+                "licenseConcluded": license,
+                "externalRefs": [
+                    {
+                        "referenceType": "purl",
+                        "referenceLocator": f"{purl}@{version}",
+                    }
+                ],
+            }
+        )
+    return {"sbom": {"packages": sbom_packages}}
+
+
+class TestParsePackage:
+    """Tests for the parse_package function."""
+
+    def test_purl(self):
+        """Test that the ecosystem and name come from the purl."""
+        package = {
+            "name": "maven:org.apache.logging.log4j:log4j-core",
+            "externalRefs": [
+                {
+                    "referenceType": "purl",
+                    "referenceLocator": "pkg:maven/org.apache.logging.log4j/log4j-core@2.14.1",
+                }
+            ],
+        }
+        assert parse_package(package) == ("maven", "org.apache.logging.log4j/log4j-core")
+
+    def test_scoped_npm_package(self):
+        """Test that encoded npm scopes are decoded."""
+        package = {
+            "name": "npm:@babel/core",
+            "externalRefs": [
+                {"referenceType": "purl", "referenceLocator": "pkg:npm/%40babel/core@7.0.0"}
+            ],
+        }
+        assert parse_package(package) == ("npm", "@babel/core")
+
+    def test_name_fallback(self):
+        """Test that packages without purl use their `ecosystem:name` name."""
+        assert parse_package({"name": "pip:requests"}) == ("pip", "requests")
+
+
+class TestMatchVersion:
+    """Tests for the match_version function."""
+
+    @pytest.mark.parametrize(
+        "version, specifier, expected",
+        [
+            ("2.14.1", "", True),
+            ("2.14.1", "2.14.1", True),
+            ("2.14.1", ">=2.0,<2.15.0", True),
+            ("2.15.0", ">=2.0,<2.15.0", False),
+            ("2.9.0", ">2.10", False),
+            ("2.0.0-beta", ">=2.0.0", False),
+            ("1.2.3", "!=1.2.3", False),
+            ("2.0", "==2.0.0", True),
+        ],
+    )
+    def test_specifiers(self, version, specifier, expected):
+        """Test versions against constraints, compared numerically."""
+        assert match_version(version, specifier) is expected
+
+
+class TestDependencyIndex:
+    """Tests for the DependencyIndex class."""
+
+    LOG4J = "pkg:maven/org.apache.logging.log4j/log4j-core"
+
+    def test_query(self, tmp_path):
+        """Test that the index finds the repositories using a package."""
+        index = DependencyIndex(str(tmp_path / "index.json"))
+        assert index.update("repo-a", make_sbom((self.LOG4J, "2.14.1", "Apache-2.0")), "sha-a") == 1
+        index.update("repo-b", make_sbom((self.LOG4J, "2.17.1", "Apache-2.0")), "sha-b")
+
+        package = "org.apache.logging.log4j/log4j-core"
+        assert list(index.query("maven", package)) == [
+            ("repo-a", "2.14.1", "Apache-2.0"),
+            ("repo-b", "2.17.1", "Apache-2.0"),
+        ]
+        assert list(index.query("maven", package, "<2.15.0")) == [
+            ("repo-a", "2.14.1", "Apache-2.0")
+        ]
+        assert list(index.query("npm", "lodash")) == []
+
+    def test_incremental_update(self, tmp_path):
+        """Test that updating a repository replaces its packages, and survives a reload."""
+        location = str(tmp_path / "index.json")
+        index = DependencyIndex(location)
+        index.update("repo-a", make_sbom((self.LOG4J, "2.14.1", "Apache-2.0")), "sha-1")
+        assert index.save()
+
+        reloaded = DependencyIndex(location)
+        assert reloaded.get_head("repo-a") == "sha-1"
+        reloaded.update("repo-a", make_sbom(("pkg:npm/lodash", "4.17.21", "MIT")), "sha-2")
+
+        assert list(reloaded.query("maven", "org.apache.logging.log4j/log4j-core")) == []
+        assert list(reloaded.query("npm", "lodash")) == [("repo-a", "4.17.21", "MIT")]
+        assert reloaded.get_head("repo-a") == "sha-2"
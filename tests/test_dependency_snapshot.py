@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""Tests for the dependency_snapshot module."""
+
+import pytest
+
+from ghas_cli.utils.dependency_snapshot import (
+    DependencySnapshot,
+    diff_entries,
+    get_package_entries,
+)
+
+
+def make_sbom(*packages):
+    """SBOM of (name, version) packages."""
+    return {
+        "sbom": {
+            "packages": [
+                {"name": name, "versionInfo": version} for name, version in packages
+            ]
+        }
+    }
+
+
+class TestDiffEntries:
+    """Tests for the diff_entries function."""
+
+    def test_changes(self):
+        """Test that version bumps are reported as updates."""
+        old = ["npm:@babel/core@7.0.0", "npm:lodash@4.17.20", "pip:six@1.16.0"]
+        new = ["npm:@babel/core@7.0.0", "npm:lodash@4.17.21", "pip:requests@2.32.3"]
+        assert list(diff_entries(old, new)) == [
+            ("updated", "npm:lodash", "4.17.20", "4.17.21"),
+            ("added", "pip:requests", "", "2.32.3"),
+            ("removed", "pip:six", "1.16.0", ""),
+        ]
+
+    def test_no_changes(self):
+        """Test that identical package sets have no changes."""
+        assert list(diff_entries(["npm:lodash@4.17.21"], ["npm:lodash@4.17.21"])) == []
+
+
+class TestDependencySnapshot:
+    """Tests for the DependencySnapshot class."""
+
+    def test_delta_between_runs(self, tmp_path):
+        """Test that only the changes since the previous run are reported."""
+        location = str(tmp_path / "snapshot.json")
+        sbom = make_sbom(("npm:lodash", "4.17.20"), ("npm:lodash", "4.17.20"))
+        assert get_package_entries(sbom) == ["npm:lodash@4.17.20"]
+
+        snapshot = DependencySnapshot(location)
+        assert list(snapshot.update("repo", sbom)) == [
+            ("added", "npm:lodash", "", "4.17.20")
+        ]
+        assert snapshot.save()
+
+        snapshot = DependencySnapshot(location)
+        assert list(snapshot.update("repo", sbom)) == []
+        assert list(snapshot.update("repo", make_sbom(("npm:lodash", "4.17.21")))) == [
+            ("updated", "npm:lodash", "4.17.20", "4.17.21")
+        ]
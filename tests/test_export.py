@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""Tests for the export module."""
+
+import io
+import json
+
+import pytest
+
+from ghas_cli.utils.export import StreamWriter, is_empty_output
+
+
+class TestStreamWriter:
+    """Tests for the StreamWriter class."""
+
+    def test_ndjson(self):
+        """Test that each record is written on its own line."""
+        stream = io.StringIO()
+        writer = StreamWriter(stream)
+        writer.write({"repository": "repo-a", "number": 1})
+        writer.write({"repository": "repo-b", "number": 2})
+
+        lines = stream.getvalue().splitlines()
+        assert [json.loads(line) for line in lines] == [
+            {"repository": "repo-a", "number": 1},
+            {"repository": "repo-b", "number": 2},
+        ]
+
+    def test_csv_quoting(self):
+        """Test that CSV fields containing commas are quoted."""
+        stream = io.StringIO()
+        writer = StreamWriter(stream, format="csv", fields=["name", "license"])
+        writer.write({"name": "pkg", "license": "MIT, Apache-2.0", "extra": 1})
+
+        assert stream.getvalue() == 'name,license\npkg,"MIT, Apache-2.0"\n'
+
+    def test_csv_requires_fields(self):
+        """Test that a CSV writer without fields is rejected."""
+        with pytest.raises(ValueError):
+            StreamWriter(io.StringIO(), format="csv")
+
+    def test_periodic_flush(self):
+        """Test that the stream is flushed every few records."""
+
+        class CountingStream(io.StringIO):
+            flushes = 0
+
+            def flush(self):
+                self.flushes += 1
+
+        stream = CountingStream()
+        writer = StreamWriter(stream, flush_every=2)
+        for number in range(5):
+            writer.write({"number": number})
+        assert stream.flushes == 2
+
+
+class TestIsEmptyOutput:
+    """Tests for the is_empty_output function."""
+
+    def test_files(self, tmp_path):
+        """Test that only files with content are not empty."""
+        location = tmp_path / "secrets.csv"
+        with open(location, "a") as output:
+            assert is_empty_output(output)
+            output.write("state,resolution\n")
+        with open(location, "a") as output:
+            assert not is_empty_output(output)
+
+    def test_stdout(self):
+        """Test that stdout always gets a header."""
+        assert is_empty_output(io.StringIO())
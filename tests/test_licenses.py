@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""Tests for the licenses module."""
+
+import pytest
+
+from ghas_cli.utils.licenses import LicenseRollup, get_license_identifiers, is_copyleft
+
+
+class TestLicenseExpressions:
+    """Tests for the license expression helpers."""
+
+    def test_identifiers(self):
+        """Test that operators are not identifiers."""
+        assert get_license_identifiers("(MIT OR GPL-2.0-only) AND Apache-2.0") == [
+            "MIT",
+            "GPL-2.0-only",
+            "Apache-2.0",
+        ]
+
+    @pytest.mark.parametrize(
+        "expression, expected",
+        [
+            ("MIT", False),
+            ("Apache-2.0 AND MIT", False),
+            ("GPL-3.0-or-later", True),
+            ("MIT OR LGPL-2.1-only", True),
+            ("Unknown", False),
+        ],
+    )
+    def test_copyleft(self, expression, expected):
+        """Test the copyleft detection."""
+        assert is_copyleft(expression) is expected
+
+
+class TestLicenseRollup:
+    """Tests for the LicenseRollup class."""
+
+    def test_report(self):
+        """Test the counts per license, repository and ecosystem."""
+        rollup = LicenseRollup()
+        rollup.add(
+            "repo-a",
+            {
+                "sbom": {
+                    "packages": [
+                        {"name": "com.github.TestOrg/repo-a"},
+                        {"name": "npm:lodash", "licenseConcluded": "MIT"},
+                        {"name": "npm:readline", "licenseDeclared": "GPL-3.0-only"},
+                    ]
+                }
+            },
+        )
+        rollup.add(
+            "repo-b",
+            {"sbom": {"packages": [{"name": "pip:six", "licenseConcluded": "MIT"}]}},
+        )
+
+        report = rollup.report()
+        assert report["packages"] == 3
+        assert report["licenses"] == {"MIT": 2, "GPL-3.0-only": 1}
+        assert report["ecosystems"] == {
+            "npm": {"MIT": 1, "GPL-3.0-only": 1},
+            "pip": {"MIT": 1},
+        }
+        assert report["repositories"]["repo-b"] == {"MIT": 1}
+        assert report["copyleft_repositories"] == {"repo-a": {"GPL-3.0-only": 1}}
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""Tests for the network module."""
+
+import pytest
+
+from ghas_cli.utils.network import get_next_cursor, get_next_page
+
+
+class FakeResponse:
+    """Minimal stand-in for a requests response."""
+
+    def __init__(self, links):
+        self.links = links
+
+
+class TestGetNextCursor:
+    """Tests for the get_next_cursor function."""
+
+    def test_next_cursor(self):
+        """Test that the `after` cursor is extracted from the next link."""
+        response = FakeResponse(
+            {
+                "next": {
+                    "url": "https://api.github.com/orgs/TestOrg/dependabot/alerts?per_page=100&after=Y3Vyc29y"
+                }
+            }
+        )
+        assert get_next_cursor(response) == "Y3Vyc29y"
+
+    def test_last_page(self):
+        """Test that the last page has no cursor."""
+        assert get_next_cursor(FakeResponse({})) is None
+
+    def test_page_number_link(self):
+        """Test that a page number link is not mistaken for a cursor."""
+        response = FakeResponse(
+            {"next": {"url": "https://api.github.com/orgs/TestOrg/repos?page=2"}}
+        )
+        assert get_next_cursor(response) is None
+
+
+class TestGetNextPage:
+    """Tests for the get_next_page function."""
+
+    URL = "https://api.github.com/orgs/TestOrg/code-scanning/alerts"
+
+    def test_cursor(self):
+        """Test that the cursor is added to the same request."""
+        response = FakeResponse({"next": {"url": f"{self.URL}?per_page=100&after=abc"}})
+        assert get_next_page(response, self.URL, {"per_page": 100, "after": ""}) == (
+            self.URL,
+            {"per_page": 100, "after": "abc"},
+        )
+
+    def test_page_number_link(self):
+        """Test that a page number link is followed instead of ending the listing."""
+        next_url = f"{self.URL}?per_page=100&page=2"
+        response = FakeResponse({"next": {"url": next_url}})
+        assert get_next_page(response, self.URL, {"per_page": 100}) == (next_url, None)
+
+    def test_last_page(self):
+        """Test that there is no page after the last one."""
+        assert get_next_page(FakeResponse({}), self.URL, {"per_page": 100}) is None
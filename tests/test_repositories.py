@@ -1,9 +1,29 @@
 # -*- coding: utf-8 -*-
 """Tests for the repositories module."""
 
+import base64
+import datetime
+
 import pytest
 
-from ghas_cli.utils.repositories import Repository
+from ghas_cli.utils import repositories
+from ghas_cli.utils.repositories import (
+    Repository,
+    SearchUnavailable,
+    build_heads_query,
+    build_search_query,
+    encode_codeql_template_parts,
+    filter_codeql_languages,
+    filter_repository,
+    get_codeql_cron,
+    get_deployed_features,
+    get_topics_bulk,
+    load_codeql_base64_template,
+    load_codeql_template,
+    render_onboarding_pr_body,
+    search_org_repositories,
+    split_search_range,
+)
 
 
 class TestRepository:
@@ -118,3 +138,315 @@ class TestRepository:
         repo2 = Repository(ghas=False)
         assert repo2.ghas is False
         assert isinstance(repo2.ghas, bool)
+
+    def test_load_inventory_json(self):
+        """Test that a `to_json` export can be loaded back."""
+        repo = Repository(
+            name="test-repo",
+            orga="TestOrg",
+            languages=["actions", "python"],
+            default_branch="develop",
+        )
+        loaded = Repository()
+        loaded.load_inventory_json(repo.to_json())
+
+        assert loaded.to_json() == repo.to_json()
+
+    def test_load_json_security_state(self):
+        """Test that the security_and_analysis block is parsed."""
+        repo = Repository()
+        repo.load_json(
+            {
+                "id": 42,
+                "name": "test-repo",
+                "owner": {"type": "Organization", "login": "TestOrg"},
+                "html_url": "https://github.com/TestOrg/test-repo",
+                "description": None,
+                "language": "Python",
+                "default_branch": "develop",
+                "license": None,
+                "archived": False,
+                "disabled": False,
+                "updated_at": "2024-01-01T00:00:00Z",
+                "security_and_analysis": {
+                    "advanced_security": {"status": "enabled"},
+                    "secret_scanning": {"status": "enabled"},
+                    "secret_scanning_push_protection": {"status": "disabled"},
+                    "dependabot_security_updates": {"status": "enabled"},
+                },
+            }
+        )
+        assert repo.id == 42
+        assert repo.orga == "TestOrg"
+        assert repo.languages == []
+        assert repo.ghas is True
+        assert repo.secret_scanner is True
+        assert repo.secret_push_prot is False
+        assert repo.dependabot is True
+        assert repo.dependabot_alerts is False
+
+
+class TestGetDeployedFeatures:
+    """Tests for the get_deployed_features function."""
+
+    def test_security_state(self):
+        """Test that enabled settings are reported as deployed."""
+        repo = Repository(
+            name="test-repo", secret_scanner=True, dependabot_alerts=False
+        )
+        assert get_deployed_features(
+            "TestOrg",
+            "token",
+            repo,
+            ["secret_scanner", "push_protection", "dependabot"],
+        ) == ["secret_scanner"]
+
+    def test_unknown_dependabot_alerts(self, monkeypatch):
+        """Test that unknown Dependabot alerts are only checked for the dependabot feature."""
+        checked = []
+
+        def check_dependabot_alerts_enabled(token, organization, repository):
+            checked.append(repository)
+            return True
+
+        monkeypatch.setattr(
+            repositories,
+            "check_dependabot_alerts_enabled",
+            check_dependabot_alerts_enabled,
+        )
+        repo = Repository(name="test-repo", dependabot_alerts=None)
+
+        assert get_deployed_features("TestOrg", "token", repo, ["secret_scanner"]) == []
+        assert checked == []
+        assert get_deployed_features("TestOrg", "token", repo, ["dependabot"]) == [
+            "dependabot"
+        ]
+        assert checked == ["test-repo"]
+
+
+class TestGetRepository:
+    """Tests for the get_repository function."""
+
+    @pytest.fixture
+    def requested(self, monkeypatch):
+        """Serve a repository and its languages, and record the requested URLs."""
+        requested = []
+
+        def get(url, headers):
+            requested.append(url.rsplit("/", 1)[-1])
+            if url.endswith("/languages"):
+                return FakeResponse(200, {"Python": 100})
+            return FakeResponse(
+                200,
+                {
+                    "id": 42,
+                    "name": "test-repo",
+                    "owner": {"type": "Organization", "login": "TestOrg"},
+                    "html_url": "https://github.com/TestOrg/test-repo",
+                    "description": None,
+                    "language": "Python",
+                    "default_branch": "main",
+                    "license": None,
+                    "archived": False,
+                    "disabled": False,
+                    "updated_at": "2024-01-01T00:00:00Z",
+                },
+            )
+
+        monkeypatch.setattr(repositories.network, "get", get)
+        return requested
+
+    def test_languages_on_demand(self, requested):
+        """Test that the languages are only fetched when requested."""
+        repo = repositories.get_repository("TestOrg", "token", "test-repo")
+        assert repo.languages == []
+        assert repo.dependabot_alerts is None
+        assert requested == ["test-repo"]
+
+        repo = repositories.get_repository(
+            "TestOrg", "token", "test-repo", languages=True
+        )
+        assert repo.languages == ["actions", "python"]
+        assert requested == ["test-repo", "test-repo", "languages"]
+
+
+class TestGetTopicsBulk:
+    """Tests for the get_topics_bulk function."""
+
+    def test_topics_from_inventory(self):
+        """Test that topics known from the inventory are used as is."""
+        inventory = {
+            "repo-a": Repository(name="repo-a", topics=["security"]),
+            "repo-b": Repository(name="repo-b", topics=[]),
+        }
+        assert get_topics_bulk("token", "TestOrg", ["repo-a", "repo-b"], inventory) == {
+            "repo-a": ["security"],
+            "repo-b": [],
+        }
+
+
+class FakeResponse:
+    """Minimal stand-in for a requests response."""
+
+    def __init__(self, status_code, data=None):
+        self.status_code = status_code
+        self.data = data
+        self.content = b""
+
+    def json(self):
+        return self.data
+
+
+class TestSearchQuery:
+    """Tests for the search API backend helpers."""
+
+    def test_build_search_query(self):
+        """Test that filters are translated into search qualifiers."""
+        query = build_search_query(
+            "TestOrg",
+            status="private",
+            language="Go",
+            license="MIT",
+            archived=False,
+            topic="security",
+            pushed_after="2024-01-01",
+        )
+        assert query.split(" ") == [
+            "org:TestOrg",
+            "is:private",
+            "fork:true",
+            'language:"Go"',
+            "license:mit",
+            "archived:false",
+            "topic:security",
+            "pushed:>=2024-01-01",
+        ]
+
+    def test_split_search_range(self):
+        """Test that a date range is split into two adjacent halves."""
+        start = datetime.datetime(2020, 1, 1)
+        end = datetime.datetime(2020, 1, 3)
+        left, right = split_search_range((start, end))
+        assert left == (start, datetime.datetime(2020, 1, 2))
+        assert right == (datetime.datetime(2020, 1, 2, 0, 0, 1), end)
+
+    def test_filter_repository(self):
+        """Test the client-side filters not supported by the search API."""
+        repo = Repository(
+            name="test-repo",
+            default_branch="master",
+            topics=["security"],
+            pushed_at="2024-06-01T00:00:00Z",
+        )
+        assert filter_repository(repo, topic="security", pushed_after="2024-01-01")
+        assert not filter_repository(repo, default_branch="main")
+        assert not filter_repository(repo, pushed_after="2024-07-01")
+
+    def test_search_retries_page(self, monkeypatch):
+        """Test that a failing page is retried, then reported instead of truncated."""
+        responses = [
+            FakeResponse(403),
+            FakeResponse(200, {"total_count": 1, "items": [{"name": "repo-a"}]}),
+        ]
+        monkeypatch.setattr(
+            repositories.network, "search", lambda **kwargs: responses.pop(0)
+        )
+        repos = list(search_org_repositories("all", "TestOrg", "token"))
+        assert [r["name"] for r in repos] == ["repo-a"]
+
+        monkeypatch.setattr(
+            repositories.network, "search", lambda **kwargs: FakeResponse(502)
+        )
+        with pytest.raises(SearchUnavailable):
+            list(search_org_repositories("all", "TestOrg", "token"))
+
+
+class TestRenderOnboardingPrBody:
+    """Tests for the onboarding PR body rendering."""
+
+    def test_all_components(self):
+        """Test that every enabled component is described."""
+        body = render_onboarding_pr_body(
+            "TestOrg", "test-repo", ["actions", "python"], codeql=True, reviewer=True
+        )
+        assert "CodeQL" in body
+        assert "actions, python" in body
+        assert "Dependency Reviewer" in body
+        assert "@TestOrg/security-appsec" in body
+
+    def test_reviewer_only(self):
+        """Test that disabled components are left out."""
+        body = render_onboarding_pr_body(
+            "TestOrg", "test-repo", [], codeql=False, reviewer=True
+        )
+        assert "CodeQL" not in body
+        assert "Dependency Reviewer" in body
+
+
+class TestFilterCodeqlLanguages:
+    """Tests for the filter_codeql_languages function."""
+
+    def test_unsupported_languages_are_dropped(self):
+        """Test that only CodeQL languages are kept, with actions first."""
+        assert filter_codeql_languages(["Python", "HTML", "Shell"]) == [
+            "actions",
+            "python",
+        ]
+
+    def test_aliases_are_deduplicated(self):
+        """Test that aliased languages are mapped and not duplicated."""
+        assert filter_codeql_languages(
+            ["actions", "javascript", "typescript", "kotlin"]
+        ) == ["actions", "javascript", "java"]
+
+
+class TestCodeqlTemplate:
+    """Tests for the CodeQL workflow rendering."""
+
+    def test_seeded_cron_is_stable(self):
+        """Test that a seed always yields the same valid schedule."""
+        cron = get_codeql_cron("TestOrg/test-repo")
+        assert cron == get_codeql_cron("TestOrg/test-repo")
+        minute, hour, _, _, day = cron.split(" ")
+        assert 0 <= int(minute) < 60
+        assert 0 <= int(hour) < 24
+        assert 0 <= int(day) < 7
+
+    def test_render(self):
+        """Test that branches, languages and schedule are substituted."""
+        workflow = load_codeql_template(
+            ["actions", "python"], ["develop"], seed="TestOrg/test-repo"
+        )
+        assert "branches: ['develop']" in workflow
+        assert "language: ['actions', 'python']" in workflow
+        assert f"cron: '{get_codeql_cron('TestOrg/test-repo')}'" in workflow
+        assert "branches: [ '**' ]" in workflow
+
+    def test_base64_matches_render(self):
+        """Test that the cached base64 parts give the encoded workflow of each repository."""
+        for index in range(20):
+            seed = f"TestOrg/repo-{index}"
+            for languages in [["actions"], ["actions", "python"], ["go"]]:
+                workflow = load_codeql_template(languages, ["main"], seed=seed)
+                assert base64.b64decode(
+                    load_codeql_base64_template(languages, ["main"], seed=seed)
+                ).decode("utf-8") == workflow
+
+    def test_cached_across_repositories(self):
+        """Test that repositories with different schedules share the cached template."""
+        encode_codeql_template_parts.cache_clear()
+        load_codeql_base64_template(["actions"], ["main"], seed="TestOrg/repo-a")
+        load_codeql_base64_template(["actions"], ["main"], seed="TestOrg/repo-b")
+        assert encode_codeql_template_parts.cache_info().hits == 1
+
+
+class TestBuildHeadsQuery:
+    """Tests for the build_heads_query function."""
+
+    def test_aliases(self):
+        """Test that each repository gets its own alias."""
+        query = build_heads_query("TestOrg", ["repo-a", "repo-b"])
+        assert query.startswith("query { ")
+        assert 'r0: repository(owner: "TestOrg", name: "repo-a")' in query
+        assert 'r1: repository(owner: "TestOrg", name: "repo-b")' in query
+        assert query.count("defaultBranchRef { target { oid } }") == 2
@@ -0,0 +1,289 @@
+# -*- coding: utf-8 -*-
+"""Tests for the secrets module."""
+
+import pytest
+
+from ghas_cli.utils import secrets
+from ghas_cli.utils.cache import JsonCache
+from ghas_cli.utils.secrets import (
+    SecretScanningUnavailable,
+    apply_secret_change,
+    iter_secret_alerts,
+    sync_secret_alerts,
+)
+
+ALERTS_URL = "https://api.github.com/orgs/TestOrg/secret-scanning/alerts"
+
+
+class FakeResponse:
+    """Minimal stand-in for a requests response."""
+
+    def __init__(self, alerts, next_cursor=None, status_code=200):
+        self.alerts = alerts
+        self.status_code = status_code
+        self.content = b""
+        self.links = {}
+        if next_cursor:
+            self.links["next"] = {"url": f"{ALERTS_URL}?after={next_cursor}"}
+
+    def json(self):
+        return self.alerts
+
+
+@pytest.fixture
+def pages(monkeypatch):
+    """Serve pages of alerts by cursor, and record the requested cursors."""
+    pages = {
+        "": FakeResponse([{"number": 1}, {"number": 2}], next_cursor="c1"),
+        "c1": FakeResponse([{"number": 3}]),
+    }
+    requested = []
+
+    def get(url, params, headers):
+        requested.append(params.get("after"))
+        return pages[params.get("after")]
+
+    monkeypatch.setattr(secrets.requests, "get", get)
+    monkeypatch.setattr(secrets.network, "check_rate_limit", lambda response: False)
+    pages["requested"] = requested
+    return pages
+
+
+class TestIterSecretAlerts:
+    """Tests for the iter_secret_alerts function."""
+
+    def test_cursor_pagination(self, pages):
+        """Test that pages are followed and checkpointed after being consumed."""
+        checkpoints = []
+        alerts = iter_secret_alerts(
+            "open", "token", "TestOrg", on_page=checkpoints.append
+        )
+
+        assert [next(alerts)["number"], next(alerts)["number"]] == [1, 2]
+        assert checkpoints == []
+        assert [a["number"] for a in alerts] == [3]
+        assert checkpoints == ["c1", None]
+
+    def test_resume(self, pages):
+        """Test that a resumed export starts after the cursor."""
+        alerts = list(iter_secret_alerts("open", "token", "TestOrg", cursor="c1"))
+        assert [a["number"] for a in alerts] == [3]
+        assert pages["requested"] == ["c1"]
+
+    def test_failure_is_raised(self, pages):
+        """Test that a failing page interrupts the export instead of truncating it."""
+        pages["c1"] = FakeResponse([], status_code=502)
+        with pytest.raises(SecretScanningUnavailable):
+            list(iter_secret_alerts("open", "token", "TestOrg"))
+
+    def test_first_page_requests_cursors(self, pages):
+        """Test that the first page opts into cursor pagination."""
+        list(iter_secret_alerts("open", "token", "TestOrg"))
+        assert pages["requested"] == ["", "c1"]
+
+    def test_next_link_without_cursor_is_raised(self, pages):
+        """Test that a page-numbered next link can't silently end the export."""
+        pages[""].links["next"] = {"url": f"{ALERTS_URL}?page=2"}
+        with pytest.raises(SecretScanningUnavailable):
+            list(iter_secret_alerts("open", "token", "TestOrg"))
+
+
+class TestIterSecretAlertsSharded:
+    """Tests for the iter_secret_alerts_sharded function."""
+
+    @pytest.fixture
+    def shards(self, monkeypatch):
+        """Serve alerts per state and secret type, and record the requested filters."""
+        shards = {
+            ("open", "slack_api_token"): [
+                {"url": f"{ALERTS_URL}/1"},
+                {"url": f"{ALERTS_URL}/2"},
+            ],
+            ("open", "google_api_key"): [{"url": f"{ALERTS_URL}/3"}],
+            # Resolved while the open alerts were exported
+            ("resolved", "slack_api_token"): [{"url": f"{ALERTS_URL}/2"}],
+            ("resolved", "google_api_key"): [],
+        }
+        requested = []
+
+        def get(url, params, headers):
+            requested.append((params["state"], params["secret_type"]))
+            return FakeResponse(shards[(params["state"], params["secret_type"])])
+
+        monkeypatch.setattr(secrets.requests, "get", get)
+        monkeypatch.setattr(secrets.network, "check_rate_limit", lambda response: False)
+        shards["requested"] = requested
+        return shards
+
+    def test_merged_without_duplicates(self, shards):
+        """Test that each shard is filtered by the API, and alerts are deduplicated."""
+        checkpoints = {}
+        alerts = secrets.iter_secret_alerts_sharded(
+            ["open", "resolved"],
+            "token",
+            "TestOrg",
+            secret_types=["slack_api_token", "google_api_key"],
+            on_page=checkpoints.__setitem__,
+        )
+
+        urls = sorted(alert["url"] for alert in alerts)
+        assert urls == [f"{ALERTS_URL}/1", f"{ALERTS_URL}/2", f"{ALERTS_URL}/3"]
+        assert len(shards["requested"]) == 4
+        assert checkpoints == {
+            "open:slack_api_token": "done",
+            "open:google_api_key": "done",
+            "resolved:slack_api_token": "done",
+            "resolved:google_api_key": "done",
+        }
+
+    def test_done_shards_are_skipped(self, shards):
+        """Test that a resumed export doesn't fetch completed shards again."""
+        alerts = list(
+            secrets.iter_secret_alerts_sharded(
+                ["open"],
+                "token",
+                "TestOrg",
+                secret_types=["slack_api_token", "google_api_key"],
+                cursors={"open:slack_api_token": "done"},
+            )
+        )
+        assert alerts == [{"url": f"{ALERTS_URL}/3"}]
+        assert shards["requested"] == [("open", "google_api_key")]
+
+    def test_failed_shard_is_raised(self, shards, monkeypatch):
+        """Test that a failing shard stops the export instead of hanging it."""
+        get = secrets.requests.get
+
+        def failing_get(url, params, headers):
+            if params["secret_type"] == "google_api_key":
+                return FakeResponse([], status_code=502)
+            return get(url, params, headers)
+
+        monkeypatch.setattr(secrets.requests, "get", failing_get)
+        with pytest.raises(SecretScanningUnavailable):
+            list(
+                secrets.iter_secret_alerts_sharded(
+                    ["open", "resolved"],
+                    "token",
+                    "TestOrg",
+                    secret_types=["slack_api_token", "google_api_key"],
+                )
+            )
+
+    def test_early_stop(self, shards):
+        """Test that a consumer stopping early doesn't leave shards blocked."""
+        alerts = secrets.iter_secret_alerts_sharded(
+            ["open", "resolved"],
+            "token",
+            "TestOrg",
+            secret_types=["slack_api_token", "google_api_key"],
+            workers=1,
+        )
+        next(alerts)
+        alerts.close()
+
+
+class TestApplySecretChange:
+    """Tests for the apply_secret_change function."""
+
+    ALERT = {
+        "url": f"{ALERTS_URL}/1",
+        "state": "open",
+        "resolution": None,
+        "updated_at": "2024-01-01T00:00:00Z",
+    }
+
+    def test_changes(self):
+        """Test that only state and resolution changes are reported as changed."""
+        store = {}
+        assert apply_secret_change(store, self.ALERT) == "new"
+        updated = {**self.ALERT, "updated_at": "2024-01-02T00:00:00Z"}
+        assert apply_secret_change(store, updated) == "updated"
+        resolved = {**self.ALERT, "state": "resolved", "resolution": "revoked"}
+        assert apply_secret_change(store, resolved) == "changed"
+        assert store[f"{ALERTS_URL}/1"]["resolution"] == "revoked"
+
+
+class TestSyncSecretAlerts:
+    """Tests for the sync_secret_alerts function."""
+
+    def test_stops_at_watermark(self, tmp_path, monkeypatch):
+        """Test that only alerts updated since the previous sync are read and reported."""
+        alerts = [
+            {
+                "url": f"{ALERTS_URL}/{n}",
+                "state": "open",
+                "resolution": None,
+                "updated_at": f"2024-01-0{n}",
+            }
+            for n in [3, 2, 1]
+        ]
+        monkeypatch.setattr(
+            secrets.requests, "get", lambda url, params, headers: FakeResponse(alerts)
+        )
+        monkeypatch.setattr(secrets.network, "check_rate_limit", lambda response: False)
+        location = str(tmp_path / "store.json")
+
+        reported = []
+        changes = sync_secret_alerts("TestOrg", "token", location, reported.append)
+        assert changes == {"new": 3}
+
+        alerts[0] = {
+            **alerts[0],
+            "state": "resolved",
+            "resolution": "revoked",
+            "updated_at": "2024-01-04",
+        }
+        reported = []
+        changes = sync_secret_alerts("TestOrg", "token", location, reported.append)
+        assert changes == {"changed": 1}
+        assert [alert["url"] for alert in reported] == [f"{ALERTS_URL}/3"]
+
+
+class TestSecretLocations:
+    """Tests for the secret locations helpers."""
+
+    def test_summarize_location(self):
+        """Test the description of commit and other locations."""
+        assert (
+            secrets.summarize_location(
+                {
+                    "type": "commit",
+                    "details": {"path": "app/.env", "start_line": 3, "commit_sha": "abc"},
+                }
+            )
+            == "app/.env:3@abc"
+        )
+        assert (
+            secrets.summarize_location(
+                {"type": "issue_title", "details": {"issue_title_url": "https://x/1"}}
+            )
+            == "issue_title:https://x/1"
+        )
+
+    def test_ordered_and_cached(self, tmp_path, monkeypatch):
+        """Test that locations follow the input order, and resolved ones are cached."""
+        fetched = []
+
+        def get_secret_locations(alert, token):
+            fetched.append(alert["url"])
+            return [f"{alert['url']}:1@abc"]
+
+        monkeypatch.setattr(secrets, "get_secret_locations", get_secret_locations)
+        alerts = [
+            {"url": f"{ALERTS_URL}/{n}", "state": state}
+            for n, state in [(1, "open"), (2, "resolved"), (3, "open")]
+        ]
+        locations_cache = JsonCache(str(tmp_path / "locations.json"))
+
+        results = list(
+            secrets.iter_secret_locations(
+                alerts, "token", workers=2, locations_cache=locations_cache
+            )
+        )
+        assert [alert["url"] for alert, _ in results] == [a["url"] for a in alerts]
+        assert results[1][1] == [f"{ALERTS_URL}/2:1@abc"]
+
+        fetched.clear()
+        list(secrets.iter_secret_locations(alerts, "token", locations_cache=locations_cache))
+        assert sorted(fetched) == [f"{ALERTS_URL}/1", f"{ALERTS_URL}/3"]
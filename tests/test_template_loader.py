@@ -1,9 +1,16 @@
 # -*- coding: utf-8 -*-
 """Tests for the template loader module."""
 
+import base64
+
 import pytest
 
-from ghas_cli.utils.template_loader import load_template
+from ghas_cli.utils.template_loader import (
+    CompiledTemplate,
+    compile_template,
+    load_base64_template,
+    load_template,
+)
 
 
 class TestLoadTemplate:
@@ -47,3 +54,38 @@ class TestLoadTemplate:
         """Test that loading a nonexistent template raises an error."""
         with pytest.raises(FileNotFoundError):
             load_template("nonexistent_template.md")
+
+
+class TestLoadBase64Template:
+    """Tests for the load_base64_template function."""
+
+    def test_matches_raw_template(self):
+        """Test that the encoded template decodes to the raw template."""
+        encoded = load_base64_template("dependency_enforcement.yml")
+        assert base64.b64decode(encoded).decode("utf-8") == load_template(
+            "dependency_enforcement.yml"
+        )
+
+
+class TestCompiledTemplate:
+    """Tests for the CompiledTemplate class."""
+
+    def test_render_matches_replace(self):
+        """Test that rendering is equivalent to replacing each placeholder."""
+        content = "a: [ ]\nb: [ ]\nc: x\na: [ ]\n"
+        template = CompiledTemplate(content, {"a": "a: [ ]", "c": "c: x"})
+        rendered = template.render(a="a: [1]", c="c: y")
+        assert rendered == content.replace("a: [ ]", "a: [1]").replace("c: x", "c: y")
+
+    def test_render_missing_field_raises_error(self):
+        """Test that a missing field raises a KeyError."""
+        template = CompiledTemplate("a: [ ]", {"a": "a: [ ]"})
+        with pytest.raises(KeyError):
+            template.render()
+
+    def test_compile_template_is_memoized(self):
+        """Test that a template is only compiled once."""
+        placeholders = (("languages", "language: [ ]"),)
+        assert compile_template(
+            "codeql-analysis-default.yml", placeholders
+        ) is compile_template("codeql-analysis-default.yml", placeholders)
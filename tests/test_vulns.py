@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""Tests for the vulns module."""
+
+import pytest
+
+from ghas_cli.utils.vulns import (
+    apply_alert_change,
+    is_code_scanning_missing,
+    summarize_alert,
+)
+
+
+class TestSummarizeAlert:
+    """Tests for the summarize_alert function."""
+
+    def test_summary_fields(self):
+        """Test that only the reported fields are kept."""
+        alert = {
+            "number": 3,
+            "created_at": "2024-01-01T00:00:00Z",
+            "state": "open",
+            "rule": {"severity": "error", "id": "py/sql-injection"},
+            "repository": {"name": "test-repo"},
+        }
+        assert summarize_alert(alert) == {
+            "number": 3,
+            "created_at": "2024-01-01T00:00:00Z",
+            "state": "open",
+            "severity": "error",
+        }
+
+
+class FakeResponse:
+    """Minimal stand-in for a requests response."""
+
+    def __init__(self, status_code, message=""):
+        self.status_code = status_code
+        self.message = message
+
+    def json(self):
+        return {"message": self.message}
+
+
+class TestIsCodeScanningMissing:
+    """Tests for the is_code_scanning_missing function."""
+
+    def test_not_found(self):
+        """Test that a 404 means no code scanning."""
+        assert is_code_scanning_missing(FakeResponse(404))
+
+    def test_not_enabled(self):
+        """Test that a 403 about the feature means no code scanning."""
+        assert is_code_scanning_missing(
+            FakeResponse(403, "Advanced Security must be enabled for this repository")
+        )
+
+    def test_rate_limit(self):
+        """Test that a secondary rate limit is retried instead."""
+        assert not is_code_scanning_missing(
+            FakeResponse(403, "You have exceeded a secondary rate limit")
+        )
+        assert not is_code_scanning_missing(FakeResponse(200))
+
+
+class TestApplyAlertChange:
+    """Tests for the apply_alert_change function."""
+
+    def alert(self, state):
+        return {
+            "number": 3,
+            "created_at": "2024-01-01T00:00:00Z",
+            "updated_at": "2024-01-02T00:00:00Z",
+            "state": state,
+            "rule": {"severity": "error"},
+            "repository": {"name": "test-repo"},
+        }
+
+    def test_changes(self):
+        """Test that new alerts and state changes are classified."""
+        store = {}
+        assert apply_alert_change(store, self.alert("open")) == "new"
+        assert apply_alert_change(store, self.alert("open")) == "updated"
+        assert apply_alert_change(store, self.alert("fixed")) == "fixed"
+        assert store["test-repo/3"]["state"] == "fixed"
+        assert store["test-repo/3"]["updated_at"] == "2024-01-02T00:00:00Z"